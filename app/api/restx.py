@@ -1,23 +1,33 @@
 import datetime
+from functools import wraps
+from typing import Dict, List
 
 from utils.document_annotation_collector import DocumentAnnotationCollector
-from database.models import Annotation, Task, TrainingTimestamp
+from database.models import Annotation, PolicyText, Task, TrainingTimestamp
+from database.unit_of_work import get_unit_of_work
 
-from flask import request
+from flask import Response, after_this_request, request, stream_with_context
 from flask_jwt_extended import jwt_required
-from flask_restx import fields, Namespace, Resource
+from flask_restx import fields, marshal, Namespace, Resource
 
 from utils.create_tilt import create_tilt
+from utils.tilt_validation import create_validation_report, validate_tilt
+from utils.task_traversal import TaskTraversalOrder
+from utils.tilt_workers import iterate_in_pool
 from utils.label import AnnotationLabel
+from utils.prediction_cache import PENDING, PredictionCache
+from utils.task_collector import tombstone_task
 from utils.translator import Translator
 
 from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.annotation_ingestion import AnnotationIngestion
 from tilt_resources.task_creator import TaskCreator
+from tilt_resources.tilt_cache import RootRevision, TiltSectionCache
 
 import json
 import os
 import requests
-import fastjsonschema
+from bson import ObjectId
 from config import Config
 from mongoengine import DoesNotExist
 
@@ -45,6 +55,8 @@ task_with_id = ns.model('Task', {
                                  cls_or_instance=fields.Nested(label_fields)),
 })
 
+default_task_fields = [field for field in task_with_id.keys() if field != 'text']
+
 task_no_id_or_label = ns.model('Task', {
     'name': fields.String(required=True, description='Name of the task'),
     'text': fields.String(required=True, description='Task text (Privacy Policy)'),
@@ -64,15 +76,113 @@ timestamp = ns.model('TrainingTimestamp', {
 })
 
 
+def filter_root_tasks(root_ids: str = None):
+    """
+    Restricts the root tasks to a comma separated list of ids. Returns None if an id is malformed.
+    """
+    root_tasks = Task.objects(parent=None)
+    if root_ids:
+        root_ids = [root_id.strip() for root_id in root_ids.split(',')]
+        if not all(ObjectId.is_valid(root_id) for root_id in root_ids):
+            return None
+        root_tasks = root_tasks(id__in=root_ids)
+    return root_tasks
+
+
+def load_task_texts(tasks: List[Task]) -> Dict[ObjectId, str]:
+    """
+    Loads the texts of a page of tasks with one query for all referenced policy texts. Tasks which were not
+    migrated yet have no policy text, their inline texts are loaded with a second query.
+    """
+    text_hashes = {task.policy_text.pk for task in tasks if task.policy_text}
+    policy_texts = PolicyText.objects.in_bulk(list(text_hashes)) if text_hashes else {}
+    task_texts = {task.id: policy_texts[task.policy_text.pk].text for task in tasks
+                  if task.policy_text and task.policy_text.pk in policy_texts}
+    legacy_task_ids = [task.id for task in tasks if not task.policy_text]
+    if legacy_task_ids:
+        for legacy_task in Task._get_collection().find({"_id": {"$in": legacy_task_ids}}, {"text": 1}):
+            task_texts[legacy_task["_id"]] = legacy_task.get("text")
+    return task_texts
+
+
+def etag_by_root_revision(func):
+    """
+    Answers conditional GET requests on task resources with the revision of the root task as strong ETag.
+    A matching If-None-Match header is answered with 304, before the resource is loaded or built.
+    """
+    @wraps(func)
+    def wrapper(self, id, *args, **kwargs):
+        root_id = RootRevision.get_root_id(id) if ObjectId.is_valid(id) else None
+        if root_id is None:
+            return {"msg": "Task does not exist!"}, 404
+        etag = RootRevision.get_etag(root_id)
+        if request.if_none_match.contains(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag)
+            return not_modified
+
+        @after_this_request
+        def add_etag(response):
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return func(self, id, *args, **kwargs)
+    return wrapper
+
+
 @ns.route('/')
 class TaskCollection(Resource):
 
-    @ns.marshal_with(task_with_id, as_list=True)
+    @ns.doc(params={
+        'root': 'Only return root tasks',
+        'parent': 'Only return direct subtasks of the task with this id',
+        'hierarchy': 'Only return tasks with this comma separated hierarchy',
+        'fields': 'Comma separated list of fields to return, the text is only returned if requested. '
+                  f'Default: {", ".join(default_task_fields)}',
+        'after': 'Cursor, the id of the last task of the previous page',
+        'limit': f'Page size, at most {Config.TASK_PAGE_SIZE_MAX}. Default: {Config.TASK_PAGE_SIZE}'
+    })
+    @ns.response(200, 'Success', [task_with_id], headers={'X-Next-Cursor': 'Cursor for the next page'})
     def get(self):
         """
+        Lists tasks ordered by id. If there are more tasks, the cursor for the next page is
+        returned in the X-Next-Cursor header.
         :return: list of tasks.
         """
-        return list(Task.objects)
+        tasks = Task.objects
+        if request.args.get('root', '').lower() in ['1', 'true']:
+            tasks = tasks(parent=None)
+        for id_filter in ['parent', 'after']:
+            if request.args.get(id_filter) and not ObjectId.is_valid(request.args.get(id_filter)):
+                return {"msg": f"Invalid task id supplied for {id_filter}!"}, 400
+        if request.args.get('parent'):
+            tasks = tasks(parent=request.args.get('parent'))
+        if 'hierarchy' in request.args:
+            hierarchy = request.args.get('hierarchy')
+            tasks = tasks(hierarchy=hierarchy.split(',') if hierarchy else [])
+        if request.args.get('after'):
+            tasks = tasks(id__gt=request.args.get('after'))
+
+        limit = max(1, min(request.args.get('limit', default=Config.TASK_PAGE_SIZE, type=int),
+                           Config.TASK_PAGE_SIZE_MAX))
+        selected_fields = [field for field in request.args.get('fields', '').split(',') if field in task_with_id]
+        selected_fields = selected_fields if selected_fields else list(default_task_fields)
+        if 'id' not in selected_fields:
+            selected_fields.insert(0, 'id')
+
+        # fetch one more task to determine whether there is a next page
+        # the text is a property backed by the referenced policy text, the texts are loaded in bulk
+        only_fields = ['policy_text' if field == 'text' else field for field in selected_fields]
+        tasks = list(tasks.only(*only_fields).order_by('id').limit(limit + 1))
+        headers = {}
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            headers['X-Next-Cursor'] = str(tasks[-1].id)
+        output_fields = {field: task_with_id[field] for field in selected_fields}
+        if 'text' in output_fields:
+            task_texts = load_task_texts(tasks)
+            output_fields['text'] = fields.String(attribute=lambda task: task_texts.get(task.id))
+        return marshal(tasks, output_fields), 200, headers
 
     @ns.expect(task_no_id_or_label)
     @ns.marshal_with(task_with_id)
@@ -100,6 +210,7 @@ class TaskCollection(Resource):
 @ns.param('id', 'unique task identifier')
 class TaskById(Resource):
 
+    @etag_by_root_revision
     @ns.marshal_with(task_with_id)
     def get(self, id):
         """
@@ -117,13 +228,66 @@ class TaskById(Resource):
         :param id: unique id of the task
         :return: TODO
         """
-        return Task.objects.get(id=id).delete()
+        try:
+            task = Task.objects.get(id=id)
+        except DoesNotExist:
+            return {"msg": "Task does not exist!"}, 404
+        if task.parent:
+            # the annotation which opened the subtask is deleted with it
+            parent_annotation_ids = Annotation.objects(task=task, parent_annotation__ne=None).no_dereference() \
+                .scalar('parent_annotation')
+            get_unit_of_work().delete(Annotation.objects(id__in=[ref.id for ref in parent_annotation_ids]))
+        # the subtree is removed in the background by the task collector
+        tombstone_task(task)
+        if task.parent:
+            # invalidated after the deletion, so a concurrent build can not cache the deleted subtree
+            TiltSectionCache.invalidate(task)
+            TaskTraversalOrder.invalidate(task)
+
+
+@ns.route('/<string:id>/order')
+@ns.param('id', 'unique task identifier')
+class TaskOrderById(Resource):
+
+    def get(self, id):
+        """
+        Fetches the annotation order of all tasks that belong to the same root task as the given task.
+        :param id: unique id of the task
+        :return: root task id, id of the next task and the ordered list of task ids
+        """
+        try:
+            task = Task.objects.get(id=id)
+        except DoesNotExist:
+            return {"msg": "Task does not exist!"}, 404
+        return TaskTraversalOrder.to_dict(task), 200
+
+
+@ns.route('/<string:id>/predictions')
+@ns.param('id', 'unique task identifier')
+class PredictionsByTaskId(Resource):
+
+    @ns.doc(security='apikey')
+    @jwt_required()
+    def get(self, id):
+        """
+        Fetches the TILTify predictions for the labels of a task. Missing predictions are computed in the
+        background, until they are ready the status 'pending' is returned with status code 202.
+        :param id: unique id of the task
+        :return: status and predictions
+        """
+        try:
+            task = Task.objects.get(id=id)
+        except DoesNotExist:
+            return {"msg": "Task does not exist!"}, 404
+        status, predictions = PredictionCache.get_predictions(task)
+        return {"status": status, "predictions": predictions}, 202 if status == PENDING else 200
 
 
 @ns.route('/<string:id>/annotation')
 @ns.param('id', 'unique task identifier')
 class AnnotationByTaskId(Resource):
 
+    @etag_by_root_revision
     @ns.marshal_with(annotation, as_list=True)
     def get(self, id):
         """
@@ -131,8 +295,7 @@ class AnnotationByTaskId(Resource):
         :param id: unique id of the task
         :return: annotations of task with given id
         """
-        task = Task.objects(id=id)
-        return list(Annotation.objects(task=task))
+        return list(Annotation.objects(task=id))
 
     @ns.expect(annotation)
     @ns.marshal_with(annotation)
@@ -152,6 +315,7 @@ class AnnotationByTaskId(Resource):
         if text != '' and label != '' and start and end:
             new_annotation = Annotation(task=task, label=label, text=text, start=start, end=end)
             new_annotation.save()
+            TiltSectionCache.invalidate(task, [label])
             return new_annotation
         else:
             return None, 400
@@ -187,11 +351,28 @@ class AnnotationByTaskIdInJSON(Resource):
             "start": content['start'],
             "end": content['end'],
             "text": content['text']} for content in data.values()]
-        new_annotations, current_annotations = annotation_handler.filter_new_annotations(shaped_data)
-        annotation_handler.synch_task_annotations(task, current_annotations)
+        new_annotations = annotation_handler.synch_task_annotations(task, shaped_data)
         task_creator.create_subtasks(new_annotations)
 
 
+@ns.route('/annotations/ndjson')
+class PreAnnotationsInNDJSON(Resource):
+
+    @ns.doc(security='apikey')
+    @jwt_required()
+    def post(self):
+        """
+        Ingests pre-annotations for many tasks, sent as NDJSON with one annotation per line:
+        {"task": <task id>, "label": ..., "start": ..., "end": ..., "text": ...}
+        The lines are validated against the task text, deduplicated against existing annotations and
+        committed in batches. Subtasks are created where the schema requires them.
+        :return: NDJSON with one result per line
+        """
+        results = AnnotationIngestion().ingest(request.stream)
+        return Response(stream_with_context(json.dumps(result) + "\n" for result in results),
+                        mimetype='application/x-ndjson')
+
+
 @ns.route('/document_annotations')
 class DocumentAnnotations(Resource):
 
@@ -254,21 +435,55 @@ class DocumentAnnotationsById(Resource):
 @ns.route('/tilt')
 class TiltDocumentCollection(Resource):
 
+    @ns.doc(params={
+        'stream': 'Stream the documents as NDJSON as soon as they are created',
+        'processes': 'Maximum number of worker processes used in stream mode',
+        'root_ids': 'Comma separated list of root task ids to restrict the output to'
+    })
     def get(self):
         """
-        Fetches the tilt representation of a all tasks with their current annotations in JSON
+        Fetches the tilt representation of a all tasks with their current annotations in JSON.
+        In stream mode every document is written as a single line (NDJSON) once it is ready. The documents
+        are created in parallel by a bounded pool of worker processes.
         :return: JSON tilt representation of all tasks
         """
-        documents = []
-        for task in Task.objects(parent=None):
-            documents.append(create_tilt(task.id))
+        root_tasks = filter_root_tasks(request.args.get('root_ids'))
+        if root_tasks is None:
+            return {"msg": "Invalid root task id supplied!"}, 400
+        root_task_ids = root_tasks.scalar('id')
+        if request.args.get('stream', '').lower() in ['1', 'true']:
+            documents = iterate_in_pool(root_task_ids, processes=request.args.get('processes', type=int))
+            return Response(stream_with_context(document + "\n" for document in documents),
+                            mimetype='application/x-ndjson')
+        documents = [create_tilt(root_task_id) for root_task_id in root_task_ids]
         return documents, 200
 
 
+@ns.route('/tilt/validation')
+class TiltValidationReport(Resource):
+
+    @ns.doc(security='apikey', params={
+        'processes': 'Maximum number of worker processes',
+        'root_ids': 'Comma separated list of root task ids to restrict the report to'
+    })
+    @jwt_required()
+    def get(self):
+        """
+        Validates the tilt representation of all root tasks against the complete tilt schema in parallel.
+        :return: report with the failing paths of every document
+        """
+        root_tasks = filter_root_tasks(request.args.get('root_ids'))
+        if root_tasks is None:
+            return {"msg": "Invalid root task id supplied!"}, 400
+        return create_validation_report(root_tasks.scalar('id'),
+                                        processes=request.args.get('processes', type=int)), 200
+
+
 @ns.route('/<string:id>/tilt')
 @ns.param('id', 'unique task identifier')
 class TiltDocumentByTaskId(Resource):
 
+    @etag_by_root_revision
     def get(self, id):
         """
         Fetches the tilt representation of the task with given id with their current annotations in JSON
@@ -287,13 +502,7 @@ class PushTiltToHub(Resource):
         Pushes the respective tilt-document to the tilt-hub database
         """
         document = create_tilt(id)
-
-        validate_func = fastjsonschema.compile(Config.COMPLETE_SCHEMA)
-        try:
-            validate_func(document)
-            validation = 'Validation successful!', True
-        except fastjsonschema.exceptions.JsonSchemaValueException as js:
-            validation = str(js), False
+        validation = validate_tilt(document)
 
         response = requests.post(
                    url=os.getenv('TILT_HUB_REST_URL') + '/tilt/tilt',
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import time
+import uuid
+from typing import Callable, Dict, List
+
+import click
+from config import Config
+from mongoengine import connect
+from database.models import Annotation, PolicyText, Task, TrainingQueueEntry
+from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.task_creator import TaskCreator
+from utils.task_collector import TaskCollector, tombstone_task
+
+
+def create_spans(task: Task, text: str, count: int, offset: int = 0) -> List[Dict]:
+    labels = [label["name"] for label in task.labels]
+    return [dict(task=task, label=labels[idx % len(labels)], start=idx * 10, end=idx * 10 + 5,
+                 text=text[idx * 10:idx * 10 + 5]) for idx in range(offset, offset + count)]
+
+
+def synch_per_annotation(task: Task, annotation_values: List[Dict]):
+    """
+    The previous synchronization: one lookup and possibly one save per submitted span, followed by one
+    delete per removed annotation.
+    """
+    annotation_handler = AnnotationHandler()
+    current_ids = []
+    for values in annotation_values:
+        _, annotation = annotation_handler.create_and_save_annotation(**values, return_annotation=True)
+        current_ids.append(annotation.id)
+    for annotation in Annotation.objects(task=task):
+        if annotation.id not in current_ids:
+            annotation_handler.delete(annotation)
+
+
+def synch_diff_based(task: Task, annotation_values: List[Dict]):
+    AnnotationHandler().synch_task_annotations(task, annotation_values)
+
+
+def measure(synch: Callable, task: Task, annotation_values: List[Dict]) -> float:
+    start = time.perf_counter()
+    synch(task, annotation_values)
+    return (time.perf_counter() - start) * 1000
+
+
+@click.command()
+@click.option("-n", "--spans", default=500, type=int, help="Number of spans of the task.")
+def benchmark_annotation_sync(spans):
+    """Measures the synchronization of a task with many spans for the per annotation and the diff based
+    implementation. A temporary root task is created in the configured database and removed afterwards.
+
+    Args:
+        spans ([type]): [description]
+    """
+    connect(**Config.MONGODB_SETTINGS)
+    name = f"benchmark-{uuid.uuid4()}"
+    text = name + " lorem ipsum dolor sit amet" * (spans // 2 + 10)
+    task = TaskCreator().create_root_task(name=name, text=text, url="")
+    initial = create_spans(task, text, spans)
+    # 10 % of the spans are replaced
+    changed = initial[spans // 10:] + create_spans(task, text, spans // 10, offset=spans)
+    try:
+        for synch in [synch_per_annotation, synch_diff_based]:
+            Annotation.objects(task=task).delete()
+            timings = [measure(synch, task, initial), measure(synch, task, initial), measure(synch, task, changed)]
+            click.echo(f"{synch.__name__:22} initial: {timings[0]:9.1f} ms   unchanged: {timings[1]:9.1f} ms   "
+                       f"10% changed: {timings[2]:9.1f} ms")
+    finally:
+        tombstone_task(task)
+        TaskCollector().collect()
+        TrainingQueueEntry.objects(document_name=name).delete()
+        PolicyText.objects(text_hash=task.policy_text.pk).delete()
+
+
+if __name__ == "__main__":
+    benchmark_annotation_sync()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import json
+import os
+import timeit
+
+import bson
+import click
+from config import Config
+from database.models import PolicyText
+
+
+def load_policy_texts(policy_data_dir: str):
+    policy_texts = []
+    for file_name in sorted(os.listdir(policy_data_dir)):
+        if file_name.endswith(".json"):
+            with open(os.path.join(policy_data_dir, file_name), "r") as json_file:
+                policy_texts.append(json.load(json_file)["text"])
+    return policy_texts
+
+
+def measure_reads(documents, access_text: bool, repetitions: int) -> float:
+    """
+    Measures the mean time in milliseconds to decode all documents from BSON and to load them into
+    PolicyText objects, optionally reading the text.
+    """
+    def read_documents():
+        for document in documents:
+            policy_text = PolicyText._from_son(bson.decode(document))
+            if access_text:
+                policy_text.text
+    return timeit.timeit(read_documents, number=repetitions) / repetitions * 1000
+
+
+@click.command()
+@click.option("-d", "--data_dir", default=os.path.join(Config.ROOT_PATH, "data/official_policies"),
+              type=click.Path(exists=True, file_okay=False), help="Directory of the policy corpus.")
+@click.option("-n", "--repetitions", default=20, type=int, help="Number of timed read repetitions.")
+def benchmark_text_compression(data_dir, repetitions):
+    """Compares the stored size and the read latency of plain and compressed policy texts.
+    The documents are encoded exactly as they are sent to MongoDB, no database connection is needed.
+
+    Args:
+        data_dir ([type]): [description]
+        repetitions ([type]): [description]
+    """
+    policy_texts = load_policy_texts(data_dir)
+    text_field = PolicyText._fields["text"]
+    plain_documents = []
+    compressed_documents = []
+    for text in policy_texts:
+        text_hash = PolicyText.hash_text(text)
+        plain_documents.append(bson.encode({"_id": text_hash, "text": text}))
+        compressed_documents.append(bson.encode({"_id": text_hash, "text": text_field.to_mongo(text)}))
+
+    plain_size = sum(len(document) for document in plain_documents)
+    compressed_size = sum(len(document) for document in compressed_documents)
+    click.echo(f"{len(policy_texts)} policy texts")
+    click.echo(f"stored size plain:       {plain_size / 1024:10.1f} KB")
+    click.echo(f"stored size compressed:  {compressed_size / 1024:10.1f} KB "
+               f"({compressed_size / plain_size:.1%})")
+    click.echo(f"read plain:              {measure_reads(plain_documents, True, repetitions):10.2f} ms")
+    click.echo(f"read compressed:         {measure_reads(compressed_documents, True, repetitions):10.2f} ms")
+    click.echo(f"read compressed, no text:{measure_reads(compressed_documents, False, repetitions):10.2f} ms")
+
+
+if __name__ == "__main__":
+    benchmark_text_compression()
@@ -56,6 +56,38 @@ class Config(object):
                                               mongodb_database=os.environ["MONGO_INITDB_DATABASE"],
                                               host=os.environ.get("MONGODB_HOST", "localhost"))
 
+    # task listing pagination
+    TASK_PAGE_SIZE = int(os.environ.get("TASK_PAGE_SIZE", 100))
+    TASK_PAGE_SIZE_MAX = int(os.environ.get("TASK_PAGE_SIZE_MAX", 1000))
+
+    # upper bound for worker processes creating tilt documents in parallel
+    TILT_WORKER_PROCESSES = int(os.environ.get("TILT_WORKER_PROCESSES", os.cpu_count() or 1))
+
+    # background computation of TILTify predictions, timeout in seconds
+    PREDICTION_WORKERS = int(os.environ.get("PREDICTION_WORKERS", 2))
+    PREDICTION_TIMEOUT = int(os.environ.get("PREDICTION_TIMEOUT", 3000))
+
+    # TILTify access token cache, in seconds
+    TILTIFY_AUTH_TIMEOUT = int(os.environ.get("TILTIFY_AUTH_TIMEOUT", 10))
+    TILTIFY_TOKEN_REFRESH_MARGIN = int(os.environ.get("TILTIFY_TOKEN_REFRESH_MARGIN", 60))
+    # lifetime assumed for tokens without readable expiry
+    TILTIFY_TOKEN_LIFETIME = int(os.environ.get("TILTIFY_TOKEN_LIFETIME", 300))
+    TILTIFY_RETRY_DELAY = int(os.environ.get("TILTIFY_RETRY_DELAY", 30))
+
+    # batched training calls to TILTify, durations in seconds
+    TRAINING_BATCH_SIZE = int(os.environ.get("TRAINING_BATCH_SIZE", 200))
+    TRAINING_DEBOUNCE = int(os.environ.get("TRAINING_DEBOUNCE", 30))
+    TRAINING_MAX_AGE = int(os.environ.get("TRAINING_MAX_AGE", 300))
+    TRAINING_FLUSH_INTERVAL = int(os.environ.get("TRAINING_FLUSH_INTERVAL", 10))
+    TRAINING_CLAIM_TIMEOUT = int(os.environ.get("TRAINING_CLAIM_TIMEOUT", 3600))
+
+    # lines per committed batch of the pre-annotation ingestion
+    INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 500))
+
+    # removal of deleted tasks, interval in seconds
+    COLLECTOR_BATCH_SIZE = int(os.environ.get("COLLECTOR_BATCH_SIZE", 500))
+    COLLECTOR_INTERVAL = int(os.environ.get("COLLECTOR_INTERVAL", 10))
+
     TILT_EXCEPTIONS = [
         {
             "schema_key_queue": ["dataDisclosed", "storage", "aggregationFunction"],
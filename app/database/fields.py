@@ -0,0 +1,40 @@
+import zlib
+
+from bson import Binary
+from mongoengine.base import BaseField
+
+
+class CompressedStringField(BaseField):
+    """A string field, which is stored zlib compressed. Loaded values stay compressed until the field is
+    accessed, so queries that only need other fields of the document never pay for the decompression.
+    Plain strings written before the field was introduced are read as they are.
+
+    Args:
+        compression_level (int, optional): zlib compression level. Defaults to 6.
+    """
+
+    def __init__(self, compression_level: int = 6, **kwargs):
+        self.compression_level = compression_level
+        super().__init__(**kwargs)
+
+    def __get__(self, instance, owner):
+        value = super().__get__(instance, owner)
+        if instance is not None and isinstance(value, bytes):
+            value = zlib.decompress(value).decode('utf-8')
+            # keep the decompressed value without marking the field as changed
+            instance._data[self.name] = value
+        return value
+
+    def to_mongo(self, value):
+        if isinstance(value, str):
+            return Binary(zlib.compress(value.encode('utf-8'), self.compression_level))
+        if isinstance(value, bytes):
+            return Binary(value)
+        return value
+
+    def validate(self, value):
+        if not isinstance(value, (str, bytes)):
+            self.error("CompressedStringField only accepts string values")
+
+    def prepare_query_value(self, op, value):
+        return self.to_mongo(value)
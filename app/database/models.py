@@ -1,12 +1,11 @@
-import requests
+import hashlib
 from datetime import datetime
 
 from database.db import db
+from database.fields import CompressedStringField
+from database.unit_of_work import get_unit_of_work
 from flask_user import UserMixin
 
-from config import Config, TILTIFY
-from utils.tiltify_authentication import get_tiltify_token
-
 
 # Model Entries
 class Task(db.Document):
@@ -14,10 +13,67 @@ class Task(db.Document):
     labels = db.ListField(db.DictField())
     hierarchy = db.ListField()
     parent = db.ReferenceField('Task')
+    # materialized path, root tasks have no root and no ancestors
+    root = db.ReferenceField('Task', required=False, default=None)
+    ancestors = db.ListField(db.ObjectIdField(), default=list)
     interfaces = db.ListField()
-    text = db.StringField()
+    # the policy text is stored once per content hash and only loaded, if 'text' is accessed
+    policy_text = db.LazyReferenceField('PolicyText', required=False, default=None)
     html = db.BooleanField(default=False, required=False)
     manual_labels = db.ListField(db.DictField(), required=False)
+    # tombstone, deleted tasks are removed together with their documents by the task collector
+    deleted_at = db.DateTimeField(required=False, default=None)
+
+    meta = {
+        'indexes': [
+            ('parent', 'hierarchy'),
+            'root',
+            'ancestors',
+            {'fields': ['deleted_at'], 'sparse': True}
+        ],
+        # tasks which were not migrated yet still contain the inline 'text' field
+        'strict': False
+    }
+
+    @db.queryset_manager
+    def objects(doc_cls, queryset):
+        # tombstoned tasks are hidden from all reads
+        return queryset.filter(deleted_at=None)
+
+    @db.queryset_manager
+    def all_objects(doc_cls, queryset):
+        return queryset
+
+    @property
+    def text(self) -> str:
+        if self.policy_text is None:
+            # inline text of a task that was not migrated yet
+            return self._data.get('text')
+        return self.policy_text.fetch().text
+
+
+class PolicyText(db.Document):
+    """Content addressed privacy policy text, shared by a root task and all of its subtasks."""
+    text_hash = db.StringField(primary_key=True)
+    text = CompressedStringField(required=True)
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def store(cls, text: str) -> 'PolicyText':
+        """Stores the text, if no text with the same hash exists yet.
+
+        Args:
+            text (str): [description]
+
+        Returns:
+            PolicyText: [description]
+        """
+        text_hash = cls.hash_text(text)
+        cls.objects(text_hash=text_hash).update_one(set_on_insert__text=text, upsert=True)
+        return cls(text_hash=text_hash, text=text)
 
 
 class User(db.Document, UserMixin):
@@ -44,25 +100,17 @@ class Annotation(db.Document):
     parent_annotation = db.ReferenceField('Annotation', required=False, default=None)
     child_annotation = db.ReferenceField('Annotation', required=False, default=None)
 
+    meta = {
+        'indexes': [
+            # the prefix (task, label) serves label lookups, the full index exact span lookups
+            ('task', 'label', 'start', 'end', 'text')
+        ]
+    }
+
     def save(self, *args, **kwargs):
         super(Annotation, self).save(args, kwargs)
-        tiltify_token = get_tiltify_token()
-        url = f"http://{TILTIFY.address}:{TILTIFY.port}"
-        payload = {
-            'documents': [{
-                'document': {
-                    'document_name': self.task.name,
-                    'text': self.task.text
-                },
-                'annotations': [{
-                    'annotation_label': self.label,
-                    'annotation_text': self.text,
-                    'annotation_start': self.start,
-                    'annotation_end': self.end
-                }]}],
-            'labels': [self.label]}
-        requests.post(url + "/api/train", json=payload, timeout=3000,
-                      headers={'Authorization': tiltify_token, 'Content-Type': 'application/json'})
+        # the annotation is sent to TILTify in batches by the training queue
+        get_unit_of_work().insert([TrainingQueueEntry.for_annotation(self)])
 
 
 class MetaTask(db.Document):
@@ -77,6 +125,12 @@ class MetaTask(db.Document):
     root_task = db.ReferenceField('Task', required=True)
     _hash = db.StringField(required=False)
 
+    meta = {
+        'indexes': [
+            'root_task'
+        ]
+    }
+
 
 class HiddenAnnotation(db.Document):
     """An ID in the tilt.
@@ -89,6 +143,12 @@ class HiddenAnnotation(db.Document):
     label = db.StringField(required=True)
     task = db.ReferenceField('Task', required=True)
 
+    meta = {
+        'indexes': [
+            ('task', 'label')
+        ]
+    }
+
 
 class LinkedAnnotation(db.Document):
     """Annotations that fill out automatically, when a label to a related annotation is given.
@@ -102,6 +162,98 @@ class LinkedAnnotation(db.Document):
     related_to = db.ReferenceField('Annotation')
     manual = db.BooleanField(required=True)
 
+    meta = {
+        'indexes': [
+            ('task', 'label', 'manual'),
+            'related_to'
+        ]
+    }
+
+
+class TiltSection(db.Document):
+    """Cached tilt representation of a single top-level schema section of a root task.
+    The revision is increased on every invalidation, so that a stale build can not overwrite it.
+    """
+    root_task = db.ReferenceField('Task', required=True)
+    section = db.StringField(required=True)
+    revision = db.IntField(default=0)
+    content = db.StringField(required=False)
+    section_hash = db.StringField(required=False)
+
+    meta = {
+        'cache': True,
+        'indexes': [
+            {'fields': ['root_task', 'section'], 'unique': True}
+        ]
+    }
+
+
+class TaskRevision(db.Document):
+    """Revision counter of a root task. Every write to the root task or one of its subtasks increases it,
+    it is used as ETag of the task resources.
+    """
+    root_task = db.ReferenceField('Task', required=True, unique=True)
+    revision = db.IntField(default=0)
+
+    meta = {'cache': True}
+
+
+class TaskTraversal(db.Document):
+    """Schema ordered depth-first order of all tasks of a root task, used for the "next task" button.
+    An empty task list marks an invalidated order.
+    """
+    root_task = db.ReferenceField('Task', required=True, unique=True)
+    revision = db.IntField(default=0)
+    task_ids = db.ListField(db.ObjectIdField())
+
+    meta = {'cache': True}
+
+
+class Prediction(db.Document):
+    """Cached TILTify predictions for a policy text, a set of labels and the training timestamp of the model.
+    Entries are created as 'pending' and filled in the background.
+    """
+    text_hash = db.StringField(required=True)
+    labels_hash = db.StringField(required=True)
+    trained_at = db.DateTimeField(required=False, default=None)
+    status = db.StringField(required=True, choices=['pending', 'done', 'failed'])
+    predictions = db.ListField(db.DictField())
+    # pending entries whose computation got lost and failed entries are computed again after this time
+    retry_at = db.DateTimeField(required=True)
+
+    meta = {
+        'indexes': [
+            {'fields': ['text_hash', 'labels_hash', 'trained_at'], 'unique': True}
+        ]
+    }
+
+
+class TrainingQueueEntry(db.Document):
+    """An annotation waiting to be sent to TILTify for training. Entries are claimed by a flusher before
+    they are sent and deleted afterwards.
+    """
+    document_name = db.StringField(required=True)
+    policy_text = db.LazyReferenceField('PolicyText', required=False, default=None)
+    label = db.StringField(required=True)
+    text = db.StringField(required=True)
+    start = db.IntField(required=True)
+    end = db.IntField(required=True)
+    created = db.DateTimeField(required=True)
+    claim = db.StringField(required=False, default=None)
+    claimed_at = db.DateTimeField(required=False, default=None)
+
+    meta = {
+        'indexes': [
+            ('claim', 'created')
+        ]
+    }
+
+    @classmethod
+    def for_annotation(cls, annotation: Annotation) -> 'TrainingQueueEntry':
+        return cls(document_name=annotation.task.name, policy_text=annotation.task.policy_text,
+                   label=annotation.label, text=annotation.text, start=annotation.start, end=annotation.end,
+                   created=datetime.utcnow())
+
 
 class TrainingTimestamp(db.Document):
     """Simple timestamp object to schedule training calls to tiltify"""
@@ -0,0 +1,172 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Type
+
+from bson import ObjectId
+from mongoengine import Document, LazyReferenceField, ReferenceField
+from mongoengine.queryset import transform
+from mongoengine.queryset.base import BaseQuerySet
+from pymongo import DeleteMany, InsertOne, UpdateMany, UpdateOne
+
+# stack of open units of work per thread, requests are served by one thread each
+_scopes = threading.local()
+
+
+def referenced_models(model: Type[Document]) -> List[Type[Document]]:
+    return [field.document_type for field in model._fields.values()
+            if isinstance(field, (ReferenceField, LazyReferenceField)) and field.document_type is not model]
+
+
+class UnitOfWork:
+
+    def __init__(self, buffered: bool = True) -> None:
+        """
+        Collects inserts, updates and deletes and writes them with one ordered bulk write per collection.
+        Collections are written after the collections they reference, so readers never see references to
+        documents that do not exist yet. Cache collections (meta 'cache') are written after all data
+        collections, so an invalidation never lands before the change it protects. An unbuffered unit of
+        work writes every operation right away.
+
+        Args:
+            buffered (bool, optional): [description]. Defaults to True.
+        """
+        self.buffered = buffered
+        self.operations: Dict[Type[Document], List] = {}
+        self.write_count = 0
+
+    def insert(self, documents: List[Document]):
+        operations = {}
+        for document in documents:
+            if document.pk is None:
+                # ids are assigned up front, so the documents can be referenced before the flush
+                document.pk = ObjectId()
+            operations.setdefault(type(document), []).append(InsertOne(document.to_mongo()))
+        for model, model_operations in operations.items():
+            self.write(model, model_operations)
+
+    def update(self, queryset: BaseQuerySet, upsert: bool = False, multi: bool = True, **update):
+        """
+        Registers an update with the keyword syntax of QuerySet.update.
+
+        Args:
+            queryset (BaseQuerySet): [description]
+            upsert (bool, optional): [description]. Defaults to False.
+            multi (bool, optional): Update all matching documents. Defaults to True.
+        """
+        operation = UpdateMany if multi else UpdateOne
+        self.write(queryset._document, [operation(queryset._query, transform.update(queryset._document, **update),
+                                                  upsert=upsert)])
+
+    def delete(self, queryset: BaseQuerySet):
+        self.write(queryset._document, [DeleteMany(queryset._query)])
+
+    def write(self, model: Type[Document], operations: List):
+        """
+        Registers raw pymongo write operations on the collection of a model. Without buffering they are
+        written right away with a single bulk write.
+
+        Args:
+            model (Type[Document]): [description]
+            operations (List): [description]
+        """
+        if not operations:
+            return
+        self.operations.setdefault(model, []).extend(operations)
+        self.write_count += len(operations)
+        if not self.buffered:
+            self.flush()
+
+    def _flush_order(self) -> List[Type[Document]]:
+        ordered_models = []
+
+        def visit(model, visiting):
+            if model in ordered_models or model in visiting:
+                return
+            for referenced_model in referenced_models(model):
+                if referenced_model in self.operations:
+                    visit(referenced_model, visiting | {model})
+            ordered_models.append(model)
+
+        for model in self.operations:
+            visit(model, set())
+        # stable sort, the reference order is kept within data and within cache collections
+        return sorted(ordered_models, key=lambda model: bool(model._meta.get('cache')))
+
+    def flush(self) -> Dict[str, int]:
+        """
+        Writes all collected operations and resets the unit of work.
+
+        Returns:
+            Dict[str, int]: number of collected writes and of executed bulk writes
+        """
+        stats = {'writes': self.write_count, 'bulk_writes': len(self.operations)}
+        for model in self._flush_order():
+            model._get_collection().bulk_write(self.operations[model], ordered=True)
+        self.operations = {}
+        self.write_count = 0
+        return stats
+
+
+def _stack() -> List[UnitOfWork]:
+    if not hasattr(_scopes, 'stack'):
+        _scopes.stack = []
+    return _scopes.stack
+
+
+def get_unit_of_work() -> UnitOfWork:
+    """
+    Returns the innermost open unit of work of this thread. Outside of a unit of work the writes are
+    executed right away.
+
+    Returns:
+        UnitOfWork: [description]
+    """
+    stack = _stack()
+    return stack[-1] if stack else UnitOfWork(buffered=False)
+
+
+def begin_unit_of_work() -> UnitOfWork:
+    unit_of_work = UnitOfWork()
+    _stack().append(unit_of_work)
+    return unit_of_work
+
+
+def end_unit_of_work(flush: bool = True) -> Dict[str, int]:
+    """
+    Closes the innermost unit of work of this thread. Its writes are flushed or discarded.
+
+    Args:
+        flush (bool, optional): [description]. Defaults to True.
+
+    Returns:
+        Dict[str, int]: flush statistics, None if nothing was flushed
+    """
+    stack = _stack()
+    if not stack:
+        return None
+    unit_of_work = stack.pop()
+    return unit_of_work.flush() if flush else None
+
+
+def discard_units_of_work():
+    """
+    Discards all open units of work of this thread.
+    """
+    _stack().clear()
+
+
+@contextmanager
+def unit_of_work() -> Iterator[UnitOfWork]:
+    """
+    Opens a unit of work, which is flushed when the block is left without an exception.
+
+    Yields:
+        Iterator[UnitOfWork]: [description]
+    """
+    scope = begin_unit_of_work()
+    try:
+        yield scope
+    except Exception:
+        end_unit_of_work(flush=False)
+        raise
+    end_unit_of_work()
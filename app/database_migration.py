@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 
 import click
-from utils.migration_task import HtmlTaskTag, SubtaskAnnotation, DeleteUnboundObj
+from utils.migration_task import HtmlTaskTag, SubtaskAnnotation, DeleteUnboundObj, TaskMaterializedPath, \
+    CreateIndexes, DeduplicatePolicyTexts, CompressPolicyTexts
 
 
 @click.command()
@@ -18,7 +19,11 @@ def migrate_db(task_name):
     task_mapping = {
         "task_html_entry": HtmlTaskTag,
         "subtask_annotation": SubtaskAnnotation,
-        "delete_unbound_obj": DeleteUnboundObj
+        "delete_unbound_obj": DeleteUnboundObj,
+        "task_materialized_path": TaskMaterializedPath,
+        "create_indexes": CreateIndexes,
+        "deduplicate_policy_texts": DeduplicatePolicyTexts,
+        "compress_policy_texts": CompressPolicyTexts
     }
 
     migration_task = task_mapping.get(task_name, None)
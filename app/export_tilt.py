@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+import click
+from config import Config
+from mongoengine import connect
+from utils.tilt_export import TiltExporter
+
+
+@click.command()
+@click.option("-o", "--output", required=True, type=click.Path(),
+              help="Output directory, or output file if --jsonl is set.")
+@click.option("--jsonl", is_flag=True, default=False, help="Write all documents into a single JSONL file.")
+@click.option("-c", "--checkpoint", default=None, type=click.Path(dir_okay=False),
+              help="Checkpoint file. Defaults to <output>.checkpoint")
+@click.option("-p", "--processes", default=Config.TILT_WORKER_PROCESSES, type=int,
+              help="Number of worker processes.")
+@click.option("-f", "--force", is_flag=True, default=False, help="Ignore the checkpoint and export everything.")
+def export_tilts(output, jsonl, checkpoint, processes, force):
+    """Exports the tilt documents of all root tasks.
+    Documents which did not change since the last export are skipped, an interrupted export resumes
+    where it stopped.
+
+    Args:
+        output ([type]): [description]
+        jsonl ([type]): [description]
+        checkpoint ([type]): [description]
+        processes ([type]): [description]
+        force ([type]): [description]
+    """
+    connect(**Config.MONGODB_SETTINGS)
+    tilt_exporter = TiltExporter(output_path=output, jsonl=jsonl, checkpoint_path=checkpoint,
+                                 processes=processes, force=force)
+    result = tilt_exporter.run()
+    click.echo(f"Exported {result['exported']}, skipped {result['skipped']} unchanged "
+               f"and failed {result['failed']} documents.")
+
+
+if __name__ == "__main__":
+    export_tilts()
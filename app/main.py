@@ -1,14 +1,15 @@
-import requests
 import json
+from collections import defaultdict
 
 from mongoengine.errors import DoesNotExist
 from api.restx import ns
 
 
-from config import Config, TILTIFY
+from config import Config
 
 from database.db import db
 from database.models import Task, User, Annotation
+from database.unit_of_work import begin_unit_of_work, discard_units_of_work, end_unit_of_work
 
 from flask import Blueprint, flash, Flask, Markup, render_template, redirect, request, url_for
 from flask_babel import _, Babel, Domain
@@ -16,10 +17,12 @@ from flask_jwt_extended import create_access_token, JWTManager
 from flask_restx import Api, fields, Resource
 from flask_user import current_user, login_required, UserManager
 from utils.description_finder import DescriptonFinder
-from utils.document_annotation_collector import DocumentAnnotationCollector
 from utils.feeder import Feeder
-from utils.schema_tools import get_manual_bools, reduce_schema, retrieve_schema_level
-from utils.tiltify_authentication import get_tiltify_token
+from utils.prediction_cache import PredictionCache
+from utils.schema_tools import get_manual_bools
+from utils.task_collector import TaskCollector
+from utils.task_traversal import TaskTraversalOrder
+from utils.training_queue import TrainingQueue
 from utils.translator import Translator
 
 # Initialize Flask App
@@ -32,9 +35,46 @@ db.init_app(app)
 domain = Domain()
 babel = Babel(app, default_locale='de')
 
-# Policies
-feeder = Feeder(policy_data_dir=Config.POLICY_DIR)
-feeder.feed_app_with_policies()
+# Background Services
+training_queue = TrainingQueue()
+task_collector = TaskCollector()
+
+
+def start_background_services():
+    # Policies
+    feeder = Feeder(policy_data_dir=Config.POLICY_DIR)
+    feeder.feed_app_with_policies()
+    # Training Queue
+    training_queue.start()
+    # Removal of deleted Tasks
+    task_collector.start()
+
+
+# spawned tilt worker processes import this module as __mp_main__, they only need the worker functions
+if __name__ != "__mp_main__":
+    start_background_services()
+
+
+# Unit of Work per Request
+@app.before_request
+def open_unit_of_work():
+    begin_unit_of_work()
+
+
+@app.after_request
+def flush_unit_of_work(response):
+    # the writes of failed requests are discarded
+    stats = end_unit_of_work(flush=response.status_code < 500)
+    if stats and stats['writes']:
+        app.logger.debug(f"Unit of work: {stats['writes']} writes in {stats['bulk_writes']} bulk writes, "
+                         f"{stats['writes'] - stats['bulk_writes']} coalesced.")
+    return response
+
+
+@app.teardown_request
+def close_units_of_work(exception):
+    # requests aborted by an unhandled exception skip the after request handlers
+    discard_units_of_work()
 
 
 @babel.localeselector
@@ -47,46 +87,18 @@ def get_locale():
 
 # .../tasks/ render helper function
 def task_tree_to_dict(task_list):
-    task_tree_dict = {}
+    """
+    Builds the nested task forest from a single list of tasks. The children of every task keep the
+    order of the supplied list.
+    """
+    children = defaultdict(list)
     for task in task_list:
-        task_tree_dict[task] = task_tree_to_dict(Task.objects(parent=task))
-    return task_tree_dict
-
-
-# .../task/__id__/next helper function
-def select_next_task(task, previous_seen_task_id, hierarchy=None):
-    child_tasks = Task.objects(parent=task)
-
-    if child_tasks:
-        if hierarchy:
-            # retrieve and reduce local_schema to schema entries that are hierarchically after hierarchy[-1]
-            local_schema = retrieve_schema_level(hierarchy[:-1])
-            local_schema = reduce_schema(local_schema, hierarchy[-1])
-
-            for entry in local_schema.keys():
-                target_hierarchy = hierarchy[:-1] + [entry]
-                target_tasks = child_tasks(hierarchy=target_hierarchy).order_by('id')
-                if Task.objects.get(id=previous_seen_task_id) in target_tasks:
-                    get_next = False
-                    for task in target_tasks:
-                        if get_next:
-                            return task.id
-                        elif task.id == previous_seen_task_id:
-                            get_next = True
-                elif target_tasks:
-                    return target_tasks.first().id
-        else:
-            # no hierarchy given (first iteration)
-            # return the first child according to schema
-            local_schema = retrieve_schema_level(task.hierarchy)
+        children[task.parent.id if task.parent else None].append(task)
+    return children_to_dict(children)
 
-            for entry in local_schema.keys():
-                target_hierarchy = task.hierarchy + [entry] if task.hierarchy else [entry]
-                target_tasks = child_tasks(hierarchy=target_hierarchy).order_by('id')
-                if target_tasks:
-                    return target_tasks.first().id
 
-    return None
+def children_to_dict(children, parent_id=None):
+    return {task: children_to_dict(children, task.id) for task in children.get(parent_id, [])}
 
 
 # Character Escaping Filters for Templates
@@ -114,28 +126,23 @@ def index():
 @login_required
 def tasks():
     # tasks = gather_task_list()
-    tasks = task_tree_to_dict(Task.objects(parent=None))
+    tasks = task_tree_to_dict(Task.objects.only('name', 'parent').no_dereference())
     return render_template('tasks.html', tasks=tasks)
 
 
 @app.route('/tasks/<string:task_id>/next')
 @login_required
-def redirect_to_next_task(task_id, previous_seen_task_id=None, hierarchy=None):
+def redirect_to_next_task(task_id):
     try:
         task = Task.objects.get(id=task_id)
-        # select first child task according to schema
-        next_task = select_next_task(task, previous_seen_task_id=previous_seen_task_id, hierarchy=hierarchy)
+        # the next task according to the precomputed, schema ordered traversal of the root task
+        next_task = TaskTraversalOrder.get_next_task_id(task)
         if next_task:
             return redirect(url_for("label", task_id=next_task))
         else:
-            if task.parent:
-                # there may be siblings
-                return redirect_to_next_task(task_id=task.parent.id, previous_seen_task_id=task.id,
-                                            hierarchy=task.hierarchy)
-            else:
-                # there are no siblings left, therefore the annotation process is finished
-                flash(_("Finished annotating all subtasks!"), 'success')
-                return redirect(url_for("tasks"))
+            # there are no tasks left, therefore the annotation process is finished
+            flash(_("Finished annotating all subtasks!"), 'success')
+            return redirect(url_for("tasks"))
     except DoesNotExist:
         return redirect(url_for("tasks"))
 
@@ -193,25 +200,19 @@ def label(task_id):
     # prepare label lookup dict for predictions JS functionalities (1-indexed)
     label_lookup = [entry["name"] for entry in task.labels]
 
-    # handle JWT access token for TILTer and TILTify
-    url = f"http://{TILTIFY.address}:{TILTIFY.port}"
-    tiltify_token = get_tiltify_token()
+    # handle JWT access token for TILTer
     tilter_token = create_access_token(identity=current_user.username)
 
-    doc_annotation_collector = DocumentAnnotationCollector()
-    pred_doc = doc_annotation_collector.create_annotation_dict(task)
-    payload = {
-        "document": pred_doc,
-        "labels": label_lookup
-    }
-
-    # TODO: if unlucky, web sockets & format response
-    # get predictions from TILTify
-    predictions = requests.post(url + '/api/predict', json=payload, timeout=3000,
-                             headers={'Authorization': tiltify_token, 'Content-Type': 'application/json'}).json()
+    # cached predictions are rendered directly, missing ones are computed in the background and fetched by the page
+    prediction_status, predictions = PredictionCache.get_predictions(task)
+    predictions_url = request.url_root + 'api/task/' + str(task_id) + '/predictions'
+    prediction_labels = {entry: _(entry) for entry in label_lookup}
+    PredictionCache.prefetch_next(task)
 
     return render_template('label.html', task=task, target_url=target_url, annotations=annotations,
-                           redirect_url=redirect_url, colors=colors, predictions=predictions["predictions"],
+                           redirect_url=redirect_url, colors=colors, predictions=predictions,
+                           prediction_status=prediction_status, predictions_url=predictions_url,
+                           prediction_labels=prediction_labels,
                            annotation_descriptions=annotation_descriptions, label_lookup=label_lookup,
                            manual_bools=manual_bools, tooltips=tooltips, token=tilter_token, tilt_ref_url=tilt_ref_url)
 
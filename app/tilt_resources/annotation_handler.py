@@ -1,6 +1,11 @@
 from mongoengine import DoesNotExist
-from typing import Union, Tuple, List
-from database.models import Annotation, LinkedAnnotation, Task, HiddenAnnotation, MetaTask
+from pymongo import UpdateOne
+from typing import Dict, Union, Tuple, List
+from database.models import Annotation, LinkedAnnotation, Task, TrainingQueueEntry
+from database.unit_of_work import get_unit_of_work
+from tilt_resources.tilt_cache import TiltSectionCache
+from utils.task_collector import tombstone_task
+from utils.task_traversal import TaskTraversalOrder
 
 
 class AnnotationHandler:
@@ -52,16 +57,31 @@ class AnnotationHandler:
         if not annotation:
             annotation = Annotation(task=task, text=text, start=start, end=end, label=label)
             annotation.save()
+            TiltSectionCache.invalidate(task, [label])
             created = True
         else:
             print(f"Annotation {annotation.label} already exists!")
             created = False
         return created, annotation if return_annotation else None
 
+    def insert_annotations(self, annotations: List[Annotation]):
+        """
+        Inserts new annotations in bulk and queues them for training.
+
+        Args:
+            annotations (List[Annotation]): [description]
+        """
+        unit_of_work = get_unit_of_work()
+        unit_of_work.insert(annotations)
+        unit_of_work.insert([TrainingQueueEntry.for_annotation(annotation) for annotation in annotations])
+
     def delete(self, annotation: Annotation = None):
         if annotation:
+            task = annotation.task
             deletion_msg = self._delete_tied_objects(annotation)
-            annotation.delete()
+            get_unit_of_work().delete(Annotation.objects(id=annotation.id))
+            # invalidated after the delete, so a concurrent build can not cache the old annotations
+            TiltSectionCache.invalidate(task, [annotation.label])
             print(f"Deleted Annotation with Label: {annotation.label} -- " + deletion_msg)
 
     def _delete_tied_objects(self, annotation):
@@ -85,81 +105,95 @@ class AnnotationHandler:
             tied_task = annotation.task
         else:
             return ""
-        tied_annotation.delete()
-        self._delete_task_objects(tied_task)
-        tied_task.delete()
+        get_unit_of_work().delete(Annotation.objects(id=tied_annotation.id))
+        tombstone_task(tied_task)
+        TaskTraversalOrder.invalidate(tied_task)
         return "Annotation was tied to Subtask, deleted Subtask and its Annotations"
 
-    def filter_new_annotations(self, annotation_list: List[Annotation]):
+    def synch_task_annotations(self, task: Task, annotation_values: List[Dict]) -> List[Annotation]:
         """
-        Filters our new annotations from a list of given annotation values. Every new annotation will be
-        created. A list of newly created annotations, and all annotations generated from the provided list
-        will be created.
+        Synchronizes the annotations of a task with the submitted annotation values. The current annotations
+        are loaded with a single query and compared by (label, start, end, text). Missing annotations are
+        inserted in bulk and annotations, which were not submitted, are deleted in bulk. Annotations that are
+        tied to a subtask are deleted one by one together with their subtask.
 
         Args:
-            annotation_list ([type]): [description]
+            task (Task): [description]
+            annotation_values (List[Dict]): [description]
 
         Returns:
-            [type]: [description]
+            List[Annotation]: newly created annotations
         """
-        for annotation_arguments in annotation_list:
-            created, annotation = self.create_and_save_annotation(**annotation_arguments,
-                                                                  return_annotation=True)
-            if created:
-                self.new_annotations.append(annotation)
-            self.all_current_annotations.append(annotation.id)
-        return self.new_annotations, self.all_current_annotations
-
-    def synch_task_annotations(self, task: Task, current_annotation_list: List[Annotation]):
+        current_annotations = {}
+        removed_annotations = []
+        for annotation in Annotation.objects(task=task).no_dereference():
+            key = (annotation.label, annotation.start, annotation.end, annotation.text)
+            if key in current_annotations:
+                removed_annotations.append(annotation)
+            else:
+                current_annotations[key] = annotation
+        submitted_keys = dict.fromkeys((values["label"], values["start"], values["end"], values["text"])
+                                       for values in annotation_values)
+
+        self.new_annotations = [Annotation(task=task, label=label, start=start, end=end, text=text)
+                                for label, start, end, text in submitted_keys
+                                if (label, start, end, text) not in current_annotations]
+        if self.new_annotations:
+            self.insert_annotations(self.new_annotations)
+
+        removed_annotations += [annotation for key, annotation in current_annotations.items()
+                                if key not in submitted_keys]
+        tied_ids = [annotation.id for annotation in removed_annotations
+                    if annotation.child_annotation or annotation.parent_annotation]
+        untied_ids = [annotation.id for annotation in removed_annotations if annotation.id not in tied_ids]
+        if untied_ids:
+            get_unit_of_work().delete(Annotation.objects(id__in=untied_ids))
+        for tied_annotation in Annotation.objects(id__in=tied_ids):
+            self.delete(tied_annotation)
+
+        changed_labels = {annotation.label for annotation in self.new_annotations + removed_annotations}
+        if changed_labels:
+            TiltSectionCache.invalidate(task, list(changed_labels))
+        print(f"Created {len(self.new_annotations)} and deleted {len(removed_annotations)} Annotations.")
+
+        kept_annotations = [annotation for key, annotation in current_annotations.items() if key in submitted_keys]
+        if kept_annotations:
+            self.synch_linked_annotations(task, kept_annotations)
+        self.all_current_annotations = [annotation.id for annotation in kept_annotations + self.new_annotations]
+        return self.new_annotations
+
+    def synch_linked_annotations(self, task: Task, related_annotations: List[Annotation]):
         """
-        Deletes annotations in the list from the database that are not part of the provided task.
+        Sets the linked annotations of a task, which are related to one of the given annotations, with a
+        single update. Only the sections of the labels whose linked annotations changed are invalidated.
 
         Args:
-            task ([type]): [description]
-            current_annotation_list ([type]): [description]
+            task (Task): [description]
+            related_annotations (List[Annotation]): [description]
         """
-        for anno in Annotation.objects(task=task):
-            if anno.id not in current_annotation_list:
-                self.delete(anno)
-            else:
-                self.synch_linked_annotations(related_annotation=anno, task=task)
-
-    def synch_linked_annotations(self, task, related_annotation: None):
-        try:
-            linked_annotations = LinkedAnnotation.objects(related_to=related_annotation, task=task)
-            for linked_annotation in linked_annotations:
-                linked_annotation.value = True
-                linked_annotation.save()
-        except DoesNotExist:
-            print("No linked Annotations found.")
+        related_labels = {annotation.id: annotation.label for annotation in related_annotations}
+        unset_linked_annotations = LinkedAnnotation.objects(task=task, related_to__in=list(related_labels),
+                                                            value__ne=True)
+        changed_ids = {linked_annotation["related_to"] for linked_annotation in
+                       unset_linked_annotations.only('related_to').as_pymongo()}
+        if changed_ids:
+            get_unit_of_work().update(unset_linked_annotations, set__value=True)
+            TiltSectionCache.invalidate(task, list({related_labels[related_id] for related_id in changed_ids}))
 
     def create_manual_annotations(self, manual_bools_dict, task):
-        for manual_bool_dict in manual_bools_dict:
-            manual_bool_label, manual_bool_value = list(manual_bool_dict.items())[0]
-            try:
-                manual_bool_annotation = LinkedAnnotation.objects.get(task=task,
-                                                                      manual=True,
-                                                                      label=manual_bool_label)
-                print("Manual Annotation already exists. Overwriting Values...")
-                manual_bool_annotation.value = manual_bool_value
-            except DoesNotExist:
-                manual_bool_annotation = LinkedAnnotation(task=task, manual=True,
-                                                          value=manual_bool_value,
-                                                          label=manual_bool_label)
-            manual_bool_annotation.save()
-        print("Manual Bools created.")
+        """
+        Upserts the values of all submitted manual bools of a task in one bulk write.
 
-    def _delete_task_objects(self, task):
-        task_annotations = Annotation.objects(task=task)
-        linked_annotations = LinkedAnnotation.objects(task=task)
-        hidden_annotations = HiddenAnnotation.objects(task=task)
-        self._delete_task_annotation_obj(task_annotations)
-        self._delete_task_annotation_obj(linked_annotations)
-        self._delete_task_annotation_obj(hidden_annotations)
-        meta_objects = MetaTask.objects(root_task=task)
-        if meta_objects:
-            meta_objects.delete()
-
-    def _delete_task_annotation_obj(self, task_annotations):
-        if task_annotations:
-            [task_annotation.delete() for task_annotation in task_annotations]
+        Args:
+            manual_bools_dict ([type]): [description]
+            task ([type]): [description]
+        """
+        manual_bools = dict(list(manual_bool_dict.items())[0] for manual_bool_dict in manual_bools_dict)
+        for manual_bool_value in manual_bools.values():
+            LinkedAnnotation.value.validate(manual_bool_value)
+        get_unit_of_work().write(LinkedAnnotation, [
+            UpdateOne({'task': task.id, 'manual': True, 'label': manual_bool_label},
+                      {'$set': {'value': manual_bool_value}}, upsert=True)
+            for manual_bool_label, manual_bool_value in manual_bools.items()])
+        TiltSectionCache.invalidate(task, list(manual_bools))
+        print("Manual Bools created.")
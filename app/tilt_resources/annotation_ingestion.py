@@ -0,0 +1,165 @@
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from bson import ObjectId
+from config import Config
+from database.models import Annotation, Task
+from database.unit_of_work import unit_of_work
+from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.task_creator import TaskCreator
+from tilt_resources.tilt_cache import TiltSectionCache
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+ANNOTATION_FIELDS = ('task', 'label', 'start', 'end', 'text')
+
+
+def parse_annotation_line(line: Union[bytes, str]) -> Dict:
+    """
+    Parses a single NDJSON line into annotation values. Raises a ValueError if the line is no JSON object
+    with a task id, a label, integer offsets and a text.
+
+    Args:
+        line (Union[bytes, str]): [description]
+
+    Returns:
+        Dict: [description]
+    """
+    try:
+        values = json.loads(line)
+    except ValueError:
+        raise ValueError("Line is not valid JSON")
+    if not isinstance(values, dict):
+        raise ValueError("Line is not a JSON object")
+    missing_fields = [field for field in ANNOTATION_FIELDS if field not in values]
+    if missing_fields:
+        raise ValueError(f"Missing fields: {', '.join(missing_fields)}")
+    if not isinstance(values['task'], str) or not ObjectId.is_valid(values['task']):
+        raise ValueError("Invalid task id")
+    if any(not isinstance(values[field], int) or isinstance(values[field], bool) for field in ('start', 'end')):
+        raise ValueError("Start and end have to be integers")
+    return {field: values[field] for field in ANNOTATION_FIELDS}
+
+
+class AnnotationIngestion:
+
+    def __init__(self, batch_size: int = Config.INGEST_BATCH_SIZE) -> None:
+        """
+        Ingests pre-annotations line by line. Lines are validated against the labels and the text of their
+        task, deduplicated against the existing annotations and committed in batches: the new annotations
+        of a batch are inserted in bulk, afterwards the subtasks are created per task.
+
+        Args:
+            batch_size (int, optional): lines per batch. Defaults to Config.INGEST_BATCH_SIZE.
+        """
+        self.batch_size = batch_size
+
+    def ingest(self, lines: Iterable[Union[bytes, str]]) -> Iterator[Dict]:
+        """
+        Ingests the given NDJSON lines. Results are yielded per line, in the order of the lines, as soon as
+        the batch of the line is committed. Empty lines are skipped.
+
+        Args:
+            lines (Iterable[Union[bytes, str]]): [description]
+
+        Yields:
+            Iterator[Dict]: line number, status and either the annotation id or an error message
+        """
+        batch = []
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_number, parse_annotation_line(line)))
+            except ValueError as e:
+                batch.append((line_number, e))
+            if len(batch) >= self.batch_size:
+                yield from self.commit(batch)
+                batch = []
+        if batch:
+            yield from self.commit(batch)
+
+    def commit(self, batch: List[Tuple[int, Union[Dict, ValueError]]]) -> List[Dict]:
+        """
+        Validates and commits a batch of parsed lines.
+
+        Args:
+            batch (List[Tuple[int, Union[Dict, ValueError]]]): line numbers with parsed values or parse errors
+
+        Returns:
+            List[Dict]: [description]
+        """
+        results = {}
+        # in_bulk would bypass the queryset manager, which hides tombstoned tasks
+        tasks = {task.id: task for task in Task.objects(id__in=list({ObjectId(values['task']) for _, values in batch
+                                                                     if isinstance(values, dict)}))}
+        task_texts = {}
+        annotations_by_task = defaultdict(list)
+        for line_number, values in batch:
+            if isinstance(values, ValueError):
+                results[line_number] = self._result(line_number, INVALID, msg=str(values))
+                continue
+            task = tasks.get(ObjectId(values['task']))
+            if task is None:
+                results[line_number] = self._result(line_number, INVALID, msg="Task does not exist")
+                continue
+            if task.id not in task_texts:
+                task_texts[task.id] = task.text or ""
+            error = self._validate(values, task, task_texts[task.id])
+            if error:
+                results[line_number] = self._result(line_number, INVALID, task=task.id, msg=error)
+                continue
+            annotations_by_task[task.id].append((line_number, values))
+
+        new_annotations = defaultdict(list)
+        for task_id, task_lines in annotations_by_task.items():
+            task = tasks[task_id]
+            known_keys = {(annotation['label'], annotation['start'], annotation['end'], annotation['text'])
+                          for annotation in Annotation.objects(task=task).only(
+                              'label', 'start', 'end', 'text').as_pymongo()}
+            for line_number, values in task_lines:
+                key = (values['label'], values['start'], values['end'], values['text'])
+                if key in known_keys:
+                    results[line_number] = self._result(line_number, DUPLICATE, task=task_id)
+                    continue
+                known_keys.add(key)
+                annotation = Annotation(id=ObjectId(), task=task, label=values['label'], start=values['start'],
+                                        end=values['end'], text=values['text'])
+                new_annotations[task_id].append(annotation)
+                results[line_number] = self._result(line_number, CREATED, task=task_id, annotation=annotation.id)
+
+        if new_annotations:
+            # the writes of a batch are flushed together, also when the response is streamed
+            with unit_of_work():
+                AnnotationHandler().insert_annotations([annotation for task_annotations in new_annotations.values()
+                                                        for annotation in task_annotations])
+                for task_id, task_annotations in new_annotations.items():
+                    TiltSectionCache.invalidate(tasks[task_id], list({annotation.label
+                                                                      for annotation in task_annotations}))
+                    TaskCreator(tasks[task_id]).create_subtasks(task_annotations)
+        return [results[line_number] for line_number in sorted(results)]
+
+    @staticmethod
+    def _validate(values: Dict, task: Task, task_text: str) -> Union[str, None]:
+        if values['label'] not in {label['name'] for label in task.labels}:
+            return f"Label {values['label']} does not belong to the task"
+        if not 0 <= values['start'] < values['end'] <= len(task_text):
+            return "Offsets are out of the task text"
+        if task_text[values['start']:values['end']] != values['text']:
+            return "Text does not match the task text at the given offsets"
+        return None
+
+    @staticmethod
+    def _result(line_number: int, status: str, task: ObjectId = None, annotation: ObjectId = None,
+                msg: str = None) -> Dict:
+        result = {'line': line_number, 'status': status}
+        if task:
+            result['task'] = str(task)
+        if annotation:
+            result['annotation'] = str(annotation)
+        if msg:
+            result['msg'] = msg
+        return result
@@ -1,7 +1,6 @@
 import uuid
 from datetime import datetime
 import hashlib
-import json
 from typing import Dict
 
 from database.models import MetaTask, Task
@@ -53,21 +52,44 @@ class Meta:
                       _hash=db_document._hash)
         return cls_obj
 
-    def generate_hash_entry(self, tilt_dict):
+    def generate_hash_entry(self, section_hashes: Dict[str, str]):
         """
-        Creates a Hash Value for the Meta Tilt Entry. If the Hash Value is not equal with the previous
-        hash value, than the modified field will be updated as well.
+        Creates a Hash Value for the Meta Tilt Entry. The hash is combined from the hashes of the
+        top-level tilt sections in schema order, so the document does not have to be serialized again.
+        If the Hash Value is not equal with the previous hash value, than the modified field will be
+        updated as well.
         If hash values are identical, nothing happens.
 
         Args:
-            tilt_dict ([type]): [description]
+            section_hashes (Dict[str, str]): [description]
+
+        Returns:
+            bool: True if the hash value changed
         """
-        json_string = json.dumps(tilt_dict).encode('utf-8')
-        new_hash = hashlib.sha256(json_string).hexdigest()
+        combined_hashes = "".join(f"{section}:{section_hash}\n"
+                                  for section, section_hash in section_hashes.items())
+        new_hash = hashlib.sha256(combined_hashes.encode('utf-8')).hexdigest()
         if new_hash != self._hash:
             self.modified = datetime.now().isoformat()
             self._hash = new_hash
             print("Hash Value has been written into Metadata Object.")
+            return True
+        return False
+
+    def save_hash_entry(self, previous_hash: str = None) -> bool:
+        """
+        Persists hash and modified field with a single atomic update. The update is guarded on the
+        previous hash value, so concurrent requests do not overwrite each other.
+
+        Args:
+            previous_hash (str, optional): [description]. Defaults to None.
+
+        Returns:
+            bool: True if this call updated the database document
+        """
+        updated = MetaTask.objects(root_task=self.root_task, _hash=previous_hash).update_one(
+            set___hash=self._hash, set__modified=self.modified)
+        return updated == 1
 
     def to_tilt_dict_meta(self) -> Dict:
         tilt_dict_meta = {
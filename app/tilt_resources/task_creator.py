@@ -1,43 +1,43 @@
 from typing import Dict, List, Tuple, Union
 from collections import defaultdict
 
-from database.models import LinkedAnnotation, Task, Annotation, HiddenAnnotation
-from config import Config
+from bson import ObjectId
+from database.models import LinkedAnnotation, Task, Annotation, HiddenAnnotation, PolicyText, TrainingQueueEntry
+from database.unit_of_work import get_unit_of_work
 from utils.label import AnnotationLabel, ManualBoolLabel, LinkedBoolLabel, IdLabel, Label, LabelStrEnum
-from utils.schema_tools import construct_first_level_labels
+from utils.schema_tools import construct_first_level_labels, get_schema_node
+from utils.task_traversal import TaskTraversalOrder
 from tilt_resources.meta import Meta
-from mongoengine import DoesNotExist
+from tilt_resources.tilt_cache import TiltSectionCache, get_root_task
+from mongoengine import Q
 from langdetect import detect
+from pymongo import UpdateOne
 
 
 class TaskCreator:
 
     def __init__(self, task: Task = None) -> None:
-        self.schema = Config.SCHEMA_DICT
         if task:
             self.task = task
 
     def _retrieve_schema_level(self, path_list: List[str]) -> Dict:
-        hierarchy = self.schema
-        for path_entry in path_list:
-            try:
-                hierarchy = hierarchy[path_entry]
-            except TypeError:
-                hierarchy = hierarchy[0][path_entry]
-        if isinstance(hierarchy, list):
-            hierarchy = hierarchy[0]
-        return hierarchy
+        return get_schema_node(path_list).schema
 
     def create_subtasks(self, annotations: List[Annotation]):
         """Basic Subtask Creation.
         Once an Annotation meets condition a new subtask with corresponding labels is created.
         Depending on the entries in the schema of the created task, the Labels vary in classes.
         Depending on the label class another routine is performed.
+        All documents of a submission are built in memory with preassigned ObjectIds and written through the
+        unit of work, i.e. with one bulk write per collection.
 
         Args:
             annotations (List[Annotation]): [description]
         """
         schema_level = self._retrieve_schema_level(self.task.hierarchy)
+        touched_labels = []
+        new_tasks, new_annotations, hidden_annotations, linked_annotations = [], [], [], []
+        child_annotation_updates = []
         for annotation in annotations:
             for schema_key, schema_value in schema_level.items():
                 schema_value = schema_value[0] if isinstance(schema_value, list) else schema_value
@@ -47,9 +47,11 @@ class TaskCreator:
                     label_dict = self._filter_labels(labels)
 
                     name = self._create_task_name(annotation)
-                    new_task = Task(name=name, labels=label_dict[LabelStrEnum.ANNOTATION],
+                    new_task = Task(id=ObjectId(), name=name, labels=label_dict[LabelStrEnum.ANNOTATION],
                                     manual_labels=label_dict.get(LabelStrEnum.MANUAL),
                                     hierarchy=new_task_hierarchy, parent=self.task,
+                                    root=get_root_task(self.task),
+                                    ancestors=self._get_ancestor_ids(),
                                     interfaces=[
                                         "panel",
                                         "update",
@@ -57,23 +59,38 @@ class TaskCreator:
                                         "side-column",
                                         "predictions:menu"],
                                     html=self.task.html,
-                                    text=self.task.text)
-                    new_task.save()
+                                    policy_text=self.task.policy_text)
+                    new_tasks.append(new_task)
 
                     # create annotation for new task
                     new_task_annotation_label = self._create_task_annotation_label(schema_value)
-                    new_task_annotation = Annotation(task=new_task,
+                    new_task_annotation = Annotation(id=ObjectId(),
+                                                     task=new_task,
                                                      label=new_task_annotation_label,
                                                      text=annotation.text,
                                                      start=annotation.start,
                                                      end=annotation.end,
                                                      parent_annotation=annotation)
-                    new_task_annotation.save()
-                    annotation.update(child_annotation=new_task_annotation)
-                    self._create_id_annotations(label_dict[LabelStrEnum.ID], new_task)
-                    self._create_linked_annotations(label_dict[LabelStrEnum.LINKED],
-                                                    task=new_task,
-                                                    schema_value=schema_value)
+                    new_annotations.append(new_task_annotation)
+                    child_annotation_updates.append(UpdateOne({'_id': annotation.id},
+                                                              {'$set': {'child_annotation': new_task_annotation.id}}))
+                    hidden_annotations += self._create_id_annotations(label_dict[LabelStrEnum.ID], new_task)
+                    linked_annotations += self._create_linked_annotations(label_dict[LabelStrEnum.LINKED],
+                                                                          task=new_task,
+                                                                          schema_value=schema_value,
+                                                                          task_annotations=[new_task_annotation])
+                    touched_labels.append(annotation.label)
+        if new_tasks:
+            unit_of_work = get_unit_of_work()
+            unit_of_work.insert(new_tasks)
+            unit_of_work.insert(new_annotations)
+            unit_of_work.insert([TrainingQueueEntry.for_annotation(annotation) for annotation in new_annotations])
+            unit_of_work.insert(hidden_annotations)
+            unit_of_work.insert(linked_annotations)
+            unit_of_work.write(Annotation, child_annotation_updates)
+        if touched_labels:
+            TiltSectionCache.invalidate(self.task, touched_labels)
+            TaskTraversalOrder.invalidate(self.task)
 
     def _process_dict_entry(self, dict_entry: Dict) -> Tuple[List, List]:
         """Performs different processing routines, depending on the dictionary key and dictionary value.
@@ -143,18 +160,18 @@ class TaskCreator:
         else:
             return AnnotationLabel(name=dict_value, multiple=multiple, tilt_key=dict_key)
 
-    def _create_id_annotations(self, id_labels: IdLabel, task: Task):
-        """Creates Annotations with IDs and saves them in the Database.
+    def _create_id_annotations(self, id_labels: IdLabel, task: Task) -> List[HiddenAnnotation]:
+        """Creates Annotations with IDs. They are saved together with the other documents of the submission.
 
         Args:
             id_labels ([type]): [description]
             task ([type]): [description]
+
+        Returns:
+            List[HiddenAnnotation]: [description]
         """
-        for id_label in id_labels:
-            annotation = HiddenAnnotation(task=task,
-                                          label=id_label["name"],
-                                          value=id_label["id_value"])
-            annotation.save()
+        return [HiddenAnnotation(task=task, label=id_label["name"], value=id_label["id_value"])
+                for id_label in id_labels]
 
     def _filter_labels(self, label_list: List[Label]) -> Dict:
         """Filters Labels acording to their class and puts them into a dictionary.
@@ -171,6 +188,23 @@ class TaskCreator:
             label_dict[LabelStrEnum(label.__class__.__name__)].append(label.to_dict())
         return label_dict
 
+    def _get_ancestor_ids(self) -> List[ObjectId]:
+        """
+        Returns the materialized path of the subtasks of this task. For tasks which were not migrated yet
+        the path is found by walking up the parents.
+
+        Returns:
+            List[ObjectId]: [description]
+        """
+        if self.task.parent is None or self.task.ancestors:
+            return list(self.task.ancestors) + [self.task.id]
+        ancestor_ids = [self.task.id]
+        parent = self.task.parent
+        while parent is not None:
+            ancestor_ids.insert(0, parent.id)
+            parent = parent.parent
+        return ancestor_ids
+
     def _create_task_name(self, annotation: Annotation) -> str:
         text = annotation.text if len(annotation.text) <= 20 else annotation.text[:20] + '...'
         name = annotation.label + ' (' + text + ')' + ' - ' + self.task.name
@@ -182,9 +216,12 @@ class TaskCreator:
                         else schema_value[schema_value['_key']][0]
         return new_task_anno_label
 
-    def _create_linked_annotations(self, linked_label_list: List, task: Task, schema_value: Dict):
+    def _create_linked_annotations(self, linked_label_list: List, task: Task, schema_value: Dict,
+                                   task_annotations: List[Annotation]) -> List[LinkedAnnotation]:
+        linked_annotations = []
         for linked_label in linked_label_list:
-            related_annotation = Annotation.objects(task=task, label=linked_label["linked_entry_value"])[0]
+            related_annotation = [annotation for annotation in task_annotations
+                                  if annotation.label == linked_label["linked_entry_value"]][0]
             if linked_label["linked_entry_key"] == schema_value["_key"]:
                 subtask_key = True
             else:
@@ -194,7 +231,8 @@ class TaskCreator:
                                                  related_to=related_annotation,
                                                  value=subtask_key,
                                                  manual=False)
-            linked_annotation.save()
+            linked_annotations.append(linked_annotation)
+        return linked_annotations
 
     def create_root_task(self, name: str, text: str, url: str, html: str = None) -> Union[None, Task]:
         """Creates a Root Task for a Privacy Policy. A root task is the initial task for a privacy company.
@@ -210,10 +248,10 @@ class TaskCreator:
         """
         labels = construct_first_level_labels(as_dict=True)
         if name != '' and text != '':
-            try:
-                task = Task.objects.get(name=name, labels=labels, hierarchy=[], parent=None,
-                                        text=text)
-            except DoesNotExist:
+            # tasks which were not migrated yet still store the text inline
+            task = Task.objects(Q(policy_text=PolicyText.hash_text(text)) | Q(__raw__={'text': text}),
+                                name=name, labels=labels, hierarchy=[], parent=None).first()
+            if task is None:
                 task = Task(name=name, labels=labels, hierarchy=[], parent=None,
                             interfaces=[
                             "panel",
@@ -221,7 +259,7 @@ class TaskCreator:
                             "controls",
                             "side-column",
                             "predictions:menu"],
-                            html=html, text=text)
+                            html=html, policy_text=PolicyText.store(text))
                 task.save()
                 language = detect(text)
                 meta = Meta(name=name, url=url, root_task=task, language=language)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+from typing import Dict, List, Set
+
+from bson import ObjectId
+from config import Config
+from database.models import Task, TaskRevision, TiltSection
+from database.unit_of_work import get_unit_of_work
+from mongoengine import NotUniqueError
+from utils.prefetched_tilt import PrefetchedTiltBuilder
+
+
+def hash_content(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_root_task(task: Task) -> Task:
+    if task.root is not None:
+        return task.root
+    root = task
+    while root.parent is not None:
+        root = root.parent
+    return root
+
+
+class RootRevision:
+
+    @staticmethod
+    def get_root_id(task_id: str) -> ObjectId:
+        """
+        Finds the root task id of a task without loading the task documents. Returns None, if the task
+        does not exist.
+
+        Args:
+            task_id (str): [description]
+
+        Returns:
+            ObjectId: [description]
+        """
+        task = Task.objects(id=task_id).only('root', 'parent').as_pymongo().first()
+        if task is None:
+            return None
+        if task.get('root'):
+            return task['root']
+        if task.get('parent') is None:
+            return task['_id']
+        # subtask without materialized path
+        return get_root_task(Task.objects.get(id=task_id)).id
+
+    @staticmethod
+    def get_etag(root_id: ObjectId) -> str:
+        task_revision = TaskRevision.objects(root_task=root_id).only('revision').as_pymongo().first()
+        return f"{root_id}-{task_revision['revision'] if task_revision else 0}"
+
+    @staticmethod
+    def bump(root_task: Task):
+        get_unit_of_work().update(TaskRevision.objects(root_task=root_task), upsert=True, multi=False,
+                                  inc__revision=1)
+
+    @staticmethod
+    def drop(root_task: Task):
+        TaskRevision.objects(root_task=root_task).delete()
+
+
+class TiltSectionCache:
+
+    def __init__(self, root_task: Task) -> None:
+        """
+        Persistent cache for the top-level sections of a tilt document. Every section of the schema is
+        stored with the hash of its content. Sections are only rebuilt if a write invalidated them,
+        the remaining sections are served from the cache.
+
+        Args:
+            root_task (Task): [description]
+        """
+        self.root_task = root_task
+        self.schema = Config.SCHEMA_DICT
+        self.section_hashes = {}
+
+    def get_tilt_dict(self) -> Dict:
+        """
+        Assembles the tilt document from the cached sections. Missing or invalidated sections are
+        built from a bulk loaded task subtree, which is only loaded if at least one section needs it.
+
+        Returns:
+            Dict: [description]
+        """
+        cached_sections = {cached_section.section: cached_section
+                           for cached_section in TiltSection.objects(root_task=self.root_task)}
+        tilt_builder = None
+        tilt_dict = {}
+        for section in self.schema.keys():
+            cached_section = cached_sections.get(section)
+            if cached_section and cached_section.content is not None:
+                tilt_dict[section] = json.loads(cached_section.content)
+                self.section_hashes[section] = cached_section.section_hash
+                continue
+            if not tilt_builder:
+                tilt_builder = PrefetchedTiltBuilder(self.root_task)
+            tilt_value = tilt_builder.build_section(section)
+            content = json.dumps(tilt_value)
+            section_hash = hash_content(content)
+            self._store_section(section, content, section_hash,
+                                revision=cached_section.revision if cached_section else 0)
+            tilt_dict[section] = tilt_value
+            self.section_hashes[section] = section_hash
+        return tilt_dict
+
+    def _store_section(self, section: str, content: str, section_hash: str, revision: int):
+        """
+        Stores a freshly built section, but only if it was not invalidated in the meantime.
+        """
+        try:
+            TiltSection.objects(root_task=self.root_task, section=section, revision=revision).update_one(
+                set__content=content, set__section_hash=section_hash, upsert=True)
+        except NotUniqueError:
+            print(f"Section {section} was invalidated during creation. Skipping cache entry.")
+
+    @staticmethod
+    def find_sections(task: Task, labels: List[str] = None) -> List[str]:
+        """
+        Finds the top-level sections that are affected by a write on the given task. Subtasks always
+        belong to the first entry of their hierarchy. On root tasks the section is determined by the
+        annotation labels. If no section can be determined, all sections are returned.
+
+        Args:
+            task (Task): [description]
+            labels (List[str], optional): [description]. Defaults to None.
+
+        Returns:
+            List[str]: [description]
+        """
+        schema = Config.SCHEMA_DICT
+        if task.hierarchy:
+            return [task.hierarchy[0]]
+        sections = []
+        for label in labels or []:
+            for section, section_schema in schema.items():
+                section_schema = section_schema[0] if isinstance(section_schema, list) else section_schema
+                if section_schema["_desc"] == label and section not in sections:
+                    sections.append(section)
+        if not sections:
+            sections = list(schema.keys())
+        return sections
+
+    @staticmethod
+    def invalidate(task: Task, labels: List[str] = None):
+        """
+        Invalidates the sections of the root task, which are touched by a write on the given task, and
+        increases the revision of the root task.
+
+        Args:
+            task (Task): [description]
+            labels (List[str], optional): [description]. Defaults to None.
+        """
+        root_task = get_root_task(task)
+        RootRevision.bump(root_task)
+        for section in TiltSectionCache.find_sections(task, labels):
+            get_unit_of_work().update(TiltSection.objects(root_task=root_task, section=section), upsert=True,
+                                      multi=False, inc__revision=1, set__content=None, set__section_hash=None)
+
+    @staticmethod
+    def get_clean_root_ids() -> Set[ObjectId]:
+        """
+        Returns the ids of all root tasks, whose sections are all cached and not invalidated. For these
+        root tasks the hash in their MetaTask is up to date.
+
+        Returns:
+            Set[ObjectId]: [description]
+        """
+        section_count = len(Config.SCHEMA_DICT)
+        cached_sections = TiltSection.objects(content__ne=None).aggregate([
+            {"$group": {"_id": "$root_task", "count": {"$sum": 1}}}
+        ])
+        return {entry["_id"] for entry in cached_sections if entry["count"] == section_count}
+
+    @staticmethod
+    def drop(root_task: Task):
+        TiltSection.objects(root_task=root_task).delete()
+        RootRevision.drop(root_task)
@@ -2,26 +2,9 @@ from config import Config
 from database.models import Task, Annotation, HiddenAnnotation, MetaTask, LinkedAnnotation
 from mongoengine import DoesNotExist
 from tilt_resources.meta import Meta
+from tilt_resources.tilt_cache import TiltSectionCache, get_root_task
 from tilt_resources.tilt_creator import TiltCreator
-
-
-def get_recipients_from_category_only(annotations):
-    recipients = []
-    for annotation in annotations:
-        recipient_from_annotation = {
-            "name": None,
-            "country": None,
-            "division": None,
-            "address": None,
-            "representative": {
-                "name": None,
-                "email": None,
-                "phone": None
-            },
-            "category": annotation.text
-        }
-        recipients.append(recipient_from_annotation)
-    return recipients
+from utils.prefetched_tilt import get_recipients_from_category_only
 
 
 def iterate_through_hierarchy_level(parent_task, hierarchy):
@@ -87,14 +70,14 @@ def iterate_through_hierarchy_level(parent_task, hierarchy):
             # special case for recipientsOnlyCategory
             if hierarchy[-1] == "recipients":
                 annotations = Annotation.objects(task=parent_task, label="Data Disclosed - Recipient Category Only")
-                tilt_value += get_recipients_from_category_only(annotations)
+                tilt_value += get_recipients_from_category_only([anno.text for anno in annotations])
 
         elif type(local_schema) is dict:
             # special case for recipientsOnlyCategory
             if hierarchy[-1] == "recipients":
                 annotations = Annotation.objects(task=parent_task, label="Data Disclosed - Recipient Category Only")
                 if annotations:
-                    tilt_value += get_recipients_from_category_only(annotations)
+                    tilt_value += get_recipients_from_category_only([anno.text for anno in annotations])
                     return tilt_value
             # iterate through current schema hierarchy
             tilt_value_part = {}
@@ -145,15 +128,11 @@ def iterate_through_hierarchy_level(parent_task, hierarchy):
 
 def create_tilt(id):
     # get root task
-    root = Task.objects.get(id=id)
-    while root.parent is not None:
-        root = root.parent
+    root = get_root_task(Task.objects.get(id=id))
 
-    # populate tilt dict according to tilt schema file
-    tilt_dict = {}
-    for entry in Config.SCHEMA_DICT.keys():
-        tilt_value = iterate_through_hierarchy_level(root, [entry])
-        tilt_dict[entry] = tilt_value
+    # populate tilt dict according to tilt schema file, only invalidated sections are rebuilt
+    tilt_cache = TiltSectionCache(root)
+    tilt_dict = tilt_cache.get_tilt_dict()
 
     # TODO: this class needs to be extended
     tilt_creator = TiltCreator(tilt_dict)
@@ -164,11 +143,11 @@ def create_tilt(id):
     try:
         meta_document_obj = MetaTask.objects.get(root_task=root)
         meta_entry = Meta.from_db_document(meta_document_obj)
-        meta_entry.generate_hash_entry(tilt_dict)
 
-        # update hash for modified
-        meta_document_obj._hash = meta_entry._hash
-        meta_document_obj.save()
+        # only write if the hash changed, concurrent readers are guarded by the previous hash
+        previous_hash = meta_document_obj._hash
+        if meta_entry.generate_hash_entry(tilt_cache.section_hashes):
+            meta_entry.save_hash_entry(previous_hash)
 
         # put meta first
         meta_entry = list(meta_entry.to_tilt_dict_meta().items())
@@ -1,8 +1,99 @@
 from dataclasses import asdict, dataclass
-from typing import Dict, List
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Tuple, Union
 from config import Config
 import json
 from utils.label import LabelFactory
+from utils.schema_tools import SCHEMA_INDEX
+
+
+EXCEPTION_LIST = MappingProxyType({
+    "recipientsOnlyCategory": "category"
+})
+
+
+def get_entry_from_tilt_desc_dict(label_name: str, tilt_dict: dict) -> Union[str, Dict]:
+    """
+    Retrieves entries form the Tilt_Description Dictionary. The dictionary stores properties in
+    subdictionaries under 'properties'. Entries that are part of Tilt List entries are stored in a list
+    under 'item' -> 'anyOf'. The retrieved list stores a dictionary which follows above mentioned pattern
+    for 'properties'. Description of items can be found under "description" if the provided label_name has
+    an entry in the dictionary.
+
+    Args:
+        label_name (str): [description]
+        tilt_dict (dict): [description]
+
+    Returns:
+        Union[str, Dict]: [description]
+    """
+    desc = tilt_dict.get(label_name)
+    if not desc:
+        if tilt_dict.get("additionalProperties"):
+            try:
+                desc = tilt_dict["properties"][label_name]
+            except KeyError:
+                label_name = EXCEPTION_LIST[label_name]
+                desc = tilt_dict["properties"][label_name]
+        if tilt_dict.get("additionalItems"):
+            desc = tilt_dict["items"]["anyOf"][0]
+            desc = get_entry_from_tilt_desc_dict(label_name=label_name, tilt_dict=desc)
+    return desc
+
+
+def find_description_by_label_chain(label_chain: Tuple[str, ...], tilt_dict: Dict) -> Union[str, None]:
+    """
+    Walks through the tilt descriptions along the label chain. String entries are returned right away,
+    otherwise the description of the last reached entry is returned.
+
+    Args:
+        label_chain (Tuple[str, ...]): [description]
+        tilt_dict (Dict): [description]
+
+    Returns:
+        Union[str, None]: the description or None, if the reached entry has no description
+    """
+    for label_name in label_chain:
+        if not tilt_dict:
+            break
+        tilt_dict = get_entry_from_tilt_desc_dict(label_name, tilt_dict)
+        if isinstance(tilt_dict, str):
+            return tilt_dict
+    try:
+        return tilt_dict["description"]
+    except KeyError:
+        return None
+
+
+def compile_description_index(tilt_descriptions: Dict) -> Mapping:
+    """
+    Resolves the descriptions of all keys of all schema levels once. The index is keyed by
+    (hierarchy, tilt_key), manual bool keys are indexed with and without their leading '~'.
+
+    Args:
+        tilt_descriptions (Dict): [description]
+
+    Returns:
+        Mapping: [description]
+    """
+    description_index = {}
+    for hierarchy, schema_node in SCHEMA_INDEX.items():
+        if not isinstance(schema_node.schema, Mapping):
+            continue
+        for schema_key in schema_node.schema.keys():
+            for tilt_key in {schema_key, schema_key.lstrip("~")}:
+                try:
+                    description_index[(hierarchy, tilt_key)] = find_description_by_label_chain(
+                        hierarchy + (tilt_key,), tilt_descriptions)
+                except (KeyError, TypeError, IndexError, AttributeError):
+                    # keys without a resolvable entry are resolved (and fail) on lookup
+                    continue
+    return MappingProxyType(description_index)
+
+
+with open(Config.DESC_PATH, "r") as json_file:
+    TILT_DESCRIPTIONS = json.load(json_file)
+DESCRIPTION_INDEX = compile_description_index(TILT_DESCRIPTIONS)
 
 
 class DescriptonFinder:
@@ -11,41 +102,21 @@ class DescriptonFinder:
 
         """
         Finds all necessary descriptions for a provided task.
-        Task items store a "desc_keys" attribute which refers to the desciption keys in 'tilt_desctitions'.
+        The descriptions are looked up in the description index, which is compiled once per process from
+        'tilt_descriptions'.
         """
-        with open(Config.DESC_PATH, "r") as json_file:
-            self.tilt_descriptions = json.load(json_file)
-        self.exception_list = {
-            "recipientsOnlyCategory": "category"
-        }
-
-    def _find_description_by_label_chain(self, label_chain: List[str],
-                                         tilt_dict: Dict[str, str] = None) -> str:
-        """
-        Recursively iterate through the tilt_descriptions dict with the label chain,
-        to get a label description. Before the function is called recursively the respective dict entry from
-        the label is retrieved. The retrieval requires some conditions.
-
-        Args:
-            label_chain (List[str]): [description]
-            tilt_dict (Dict[str, str], optional): [description]. Defaults to None.
-
-        Returns:
-            str: [description]
-        """
-        if label_chain != [] and tilt_dict:
-            label_name = label_chain.pop(0)
-            tilt_entry = self._get_entry_from_tilt_desc_dict(label_name, tilt_dict)
-            if type(tilt_entry) != str:
-                description = self._find_description_by_label_chain(label_chain, tilt_entry)
-            else:
-                return tilt_entry
-        else:
-            try:
-                description = tilt_dict["description"]
-            except KeyError:
-                print(Warning(f"Could not find description key in {tilt_dict}"))
-                description = "No description found!"
+        self.tilt_descriptions = TILT_DESCRIPTIONS
+        self.description_index = DESCRIPTION_INDEX
+
+    def find_description(self, task_hierarchy: List[str], tilt_key: str) -> str:
+        hierarchy = tuple(task_hierarchy)
+        try:
+            description = self.description_index[(hierarchy, tilt_key)]
+        except KeyError:
+            description = find_description_by_label_chain(hierarchy + (tilt_key,), self.tilt_descriptions)
+        if description is None:
+            print(Warning(f"Could not find description key for {list(hierarchy) + [tilt_key]}"))
+            description = "No description found!"
         return description
 
     def find_descriptions(self, task_labels, task_hierarchy) -> Dict[str, str]:
@@ -64,43 +135,11 @@ class DescriptonFinder:
         label_factory = LabelFactory()
         for idx, label in enumerate(task_labels):
             label = label_factory.create_label(task_labels[idx])
-            label_chain = task_hierarchy + [label.tilt_key]
-            description_text = self._find_description_by_label_chain(
-                label_chain,
-                tilt_dict=self.tilt_descriptions
-                )
+            description_text = self.find_description(task_hierarchy, label.tilt_key)
             description = TiltElementDescription(name=label.name, description=description_text)
             descriptions_collection.append_description(description)
         return descriptions_collection
 
-    def _get_entry_from_tilt_desc_dict(self, label_name: str, tilt_dict: dict) -> str:
-        """
-        Retrieves entries form the Tilt_Description Dictionary. The dictionary stores properties in
-        subdictionaries under 'properties'. Entries that are part of Tilt List entries are stored in a list
-        under 'item' -> 'anyOf'. The retrieved list stores a dictionary which follows above mentioned pattern
-        for 'properties'. Description of items can be found under "description" if the provided label_name has
-        an entry in the dictionary.
-
-        Args:
-            label_name (str): [description]
-            tilt_dict (dict): [description]
-
-        Returns:
-            str: [description]
-        """
-        desc = tilt_dict.get(label_name)
-        if not desc:
-            if tilt_dict.get("additionalProperties"):
-                try:
-                    desc = tilt_dict["properties"][label_name]
-                except KeyError:
-                    label_name = self.exception_list[label_name]
-                    desc = tilt_dict["properties"][label_name]
-            if tilt_dict.get("additionalItems"):
-                desc = tilt_dict["items"]["anyOf"][0]
-                desc = self._get_entry_from_tilt_desc_dict(label_name=label_name, tilt_dict=desc)
-        return desc
-
 
 class DescriptionCollection:
 
@@ -1,11 +1,14 @@
 from abc import ABC, abstractmethod
 from mongoengine.errors import DoesNotExist
-from database.models import Task, Annotation, LinkedAnnotation
+from database.models import Task, Annotation, LinkedAnnotation, HiddenAnnotation, MetaTask, TiltSection, \
+    TaskTraversal, PolicyText, Prediction, TrainingQueueEntry, TaskRevision
 from typing import List, Dict
 from config import Config
 from mongoengine import connect
 from tqdm import tqdm
-from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.tilt_cache import TiltSectionCache
+from utils.task_collector import tombstone_task
+from utils.task_traversal import TaskTraversalOrder
 
 
 class MigrationTask(ABC):
@@ -24,6 +27,93 @@ class HtmlTaskTag(MigrationTask):
             task.update(html=False)
 
 
+class CreateIndexes(MigrationTask):
+
+    @staticmethod
+    def run_migration():
+        """
+        Creates the indexes declared in the models, existing indexes are left untouched.
+        """
+        for model in [Task, Annotation, LinkedAnnotation, HiddenAnnotation, MetaTask, TiltSection, TaskTraversal,
+                      PolicyText, Prediction, TrainingQueueEntry, TaskRevision]:
+            model.ensure_indexes()
+
+
+class TaskMaterializedPath(MigrationTask):
+
+    @staticmethod
+    def run_migration():
+        """
+        Backfills the root and the ancestor path of every subtask. The task tree is walked level by level,
+        all children of a parent are updated with a single query.
+        """
+        for root_task in tqdm(Task.objects(parent=None).only('id')):
+            Task.objects(id=root_task.id).update(set__root=None, set__ancestors=[])
+            frontier = [(root_task.id, [])]
+            while frontier:
+                next_frontier = []
+                for parent_id, parent_ancestors in frontier:
+                    ancestors = parent_ancestors + [parent_id]
+                    child_tasks = Task.objects(parent=parent_id)
+                    child_tasks.update(set__root=root_task.id, set__ancestors=ancestors)
+                    next_frontier += [(child_id, ancestors) for child_id in child_tasks.scalar('id')]
+                frontier = next_frontier
+        TaskMaterializedPath.invalidate_caches()
+
+    @staticmethod
+    def invalidate_caches():
+        """
+        Subtasks are found by their root, tilt sections and traversal orders built before the migration miss
+        them. All cache entries are invalidated and rebuilt on the next read, the revision increases keep
+        concurrent builds from storing their stale result. The tilt hashes of the MetaTasks are reset.
+        """
+        TiltSection.objects.update(inc__revision=1, set__content=None, set__section_hash=None)
+        TaskTraversal.objects.update(inc__revision=1, set__task_ids=[])
+        TaskRevision.objects.update(inc__revision=1)
+        MetaTask.objects.update(set___hash=None)
+
+
+class DeduplicatePolicyTexts(MigrationTask):
+
+    @staticmethod
+    def run_migration():
+        """
+        Moves the policy text copied into every task into the content addressed PolicyText collection.
+        Every distinct text is stored once, the tasks only keep the reference to it.
+        """
+        task_collection = Task._get_collection()
+        stored_hashes = set()
+        task_query = {"text": {"$exists": True}}
+        for task in tqdm(task_collection.find(task_query, {"text": 1}),
+                         total=task_collection.count_documents(task_query)):
+            text = task["text"]
+            policy_text_hash = None
+            if text is not None:
+                policy_text_hash = PolicyText.hash_text(text)
+                if policy_text_hash not in stored_hashes:
+                    PolicyText.store(text)
+                    stored_hashes.add(policy_text_hash)
+            task_collection.update_one({"_id": task["_id"]},
+                                       {"$set": {"policy_text": policy_text_hash}, "$unset": {"text": ""}})
+        print(f"{len(stored_hashes)} distinct policy texts are stored.")
+
+
+class CompressPolicyTexts(MigrationTask):
+
+    @staticmethod
+    def run_migration():
+        """
+        Compresses all policy texts, which are still stored as plain strings.
+        """
+        policy_text_collection = PolicyText._get_collection()
+        text_field = PolicyText._fields["text"]
+        text_query = {"text": {"$type": "string"}}
+        for policy_text in tqdm(policy_text_collection.find(text_query),
+                                total=policy_text_collection.count_documents(text_query)):
+            policy_text_collection.update_one({"_id": policy_text["_id"]},
+                                              {"$set": {"text": text_field.to_mongo(policy_text["text"])}})
+
+
 class SubtaskAnnotation(MigrationTask):
 
     @staticmethod
@@ -158,23 +248,29 @@ class DeleteUnboundObj:
 
     @staticmethod
     def run_migration():
-        annotation_handler = AnnotationHandler()
+        affected_root_ids = set()
         for annotation in Annotation.objects:
+            parent_chain = []
             try:
-                parent_chain = []
                 annotation_task = annotation.task
-                parent_chain = DeleteUnboundObj.get_task_chain(annotation_task, parent_chain)
+                DeleteUnboundObj.get_task_chain(annotation_task, parent_chain)
             except DoesNotExist:
                 annotation.delete()
-                [annotation_handler._delete_task_objects(task) for task in parent_chain]
-                [task.delete() for task in parent_chain]
+                [tombstone_task(task) for task in parent_chain]
+                affected_root_ids.update(Task.all_objects(id__in=[task.id for task in parent_chain], root__ne=None)
+                                         .no_dereference().scalar('root'))
                 print("Delete all tasks and annotations with unclear paths")
+        # the parent chains are broken, the roots are only known from the materialized path
+        for root_task in Task.objects(id__in=[root.id for root in affected_root_ids]):
+            TiltSectionCache.invalidate(root_task)
+            TaskTraversalOrder.invalidate(root_task)
 
     @staticmethod
     def get_task_chain(annotation_task, task_list):
-        task_list = task_list + [annotation_task]
+        # the list is extended in place, so the tasks below a missing parent are kept when the lookup fails
+        task_list.append(annotation_task)
         if annotation_task.parent:
-            task_list = DeleteUnboundObj.get_task_chain(annotation_task.parent, task_list)
+            DeleteUnboundObj.get_task_chain(annotation_task.parent, task_list)
         return task_list
 
     @staticmethod
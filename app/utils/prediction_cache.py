@@ -0,0 +1,144 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import requests
+from config import Config, TILTIFY
+from database.models import PolicyText, Prediction, Task, TrainingTimestamp
+from mongoengine import DoesNotExist, NotUniqueError
+from utils.document_annotation_collector import DocumentAnnotationCollector
+from utils.task_traversal import TaskTraversalOrder
+from utils.tiltify_authentication import get_tiltify_token
+
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def request_predictions(task: Task) -> List[Dict]:
+    """
+    Requests the predictions for the labels of a task from TILTify.
+
+    Args:
+        task (Task): [description]
+
+    Returns:
+        List[Dict]: [description]
+    """
+    tiltify_token = get_tiltify_token()
+    if not tiltify_token:
+        raise ConnectionError("TILTify is not available")
+    url = f"http://{TILTIFY.address}:{TILTIFY.port}"
+    payload = {
+        "document": DocumentAnnotationCollector().create_annotation_dict(task),
+        "labels": [entry["name"] for entry in task.labels]
+    }
+    response = requests.post(url + '/api/predict', json=payload, timeout=Config.PREDICTION_TIMEOUT,
+                             headers={'Authorization': tiltify_token, 'Content-Type': 'application/json'})
+    response.raise_for_status()
+    return response.json()["predictions"]
+
+
+class PredictionCache:
+
+    executor = ThreadPoolExecutor(max_workers=Config.PREDICTION_WORKERS, thread_name_prefix="prediction")
+
+    @staticmethod
+    def get_key(task: Task) -> Dict:
+        """
+        Predictions are cached per policy text, label set and training timestamp of the TILTify model, a new
+        training timestamp therefore invalidates all cached predictions.
+
+        Args:
+            task (Task): [description]
+
+        Returns:
+            Dict: [description]
+        """
+        text_hash = task.policy_text.pk if task.policy_text else PolicyText.hash_text(task.text or "")
+        labels = sorted(entry["name"] for entry in task.labels)
+        timestamp = TrainingTimestamp.objects.first()
+        return dict(text_hash=text_hash,
+                    labels_hash=hashlib.sha256(json.dumps(labels).encode('utf-8')).hexdigest(),
+                    trained_at=timestamp.timestamp if timestamp else None)
+
+    @staticmethod
+    def get_predictions(task: Task) -> Tuple[str, List[Dict]]:
+        """
+        Returns the cached predictions of a task. On a cache miss the predictions are computed in the
+        background and the status 'pending' is returned.
+
+        Args:
+            task (Task): [description]
+
+        Returns:
+            Tuple[str, List[Dict]]: status and predictions
+        """
+        key = PredictionCache.get_key(task)
+        prediction = Prediction.objects(**key).first()
+        if prediction and prediction.status == DONE:
+            return DONE, prediction.predictions
+        if PredictionCache.schedule(task, key):
+            return PENDING, []
+        return (prediction.status, []) if prediction else (PENDING, [])
+
+    @staticmethod
+    def schedule(task: Task, key: Dict = None) -> bool:
+        """
+        Schedules the background computation of the predictions of a task, unless they are cached or
+        already being computed. Lost pending entries are computed again after the prediction timeout, failed
+        entries after the TILTify retry delay. The unique index on the key makes sure only one process
+        claims a computation.
+
+        Args:
+            task (Task): [description]
+            key (Dict, optional): [description]. Defaults to None.
+
+        Returns:
+            bool: True, if the computation was scheduled
+        """
+        key = key if key else PredictionCache.get_key(task)
+        now = datetime.utcnow()
+        try:
+            Prediction.objects(status__ne=DONE, retry_at__lt=now, **key).update_one(
+                set__status=PENDING, set__predictions=[],
+                set__retry_at=now + timedelta(seconds=Config.PREDICTION_TIMEOUT), upsert=True)
+        except NotUniqueError:
+            return False
+        # predictions of previous trainings are not served anymore
+        Prediction.objects(text_hash=key["text_hash"], labels_hash=key["labels_hash"],
+                           trained_at__ne=key["trained_at"]).delete()
+        PredictionCache.executor.submit(PredictionCache._compute, task.id, key)
+        return True
+
+    @staticmethod
+    def prefetch_next(task: Task):
+        """
+        Schedules the predictions of the task following the given task in the annotation order.
+
+        Args:
+            task (Task): [description]
+        """
+        next_task_id = TaskTraversalOrder.get_next_task_id(task)
+        if next_task_id:
+            try:
+                next_task = Task.objects.get(id=next_task_id)
+            except DoesNotExist:
+                # stale traversal order, e.g. the next task was deleted
+                print(Warning(f"Next task {next_task_id} does not exist. Skipping prediction prefetch."))
+                return
+            PredictionCache.schedule(next_task)
+
+    @staticmethod
+    def _compute(task_id, key: Dict):
+        try:
+            predictions = request_predictions(Task.objects.get(id=task_id))
+        except Exception as e:
+            print(Warning(f"Predictions for task {task_id} could not be computed: {e}"))
+            Prediction.objects(**key, status=PENDING).update_one(
+                set__status=FAILED, set__retry_at=datetime.utcnow() + timedelta(seconds=Config.TILTIFY_RETRY_DELAY))
+            return
+        Prediction.objects(**key, status=PENDING).update_one(set__status=DONE, set__predictions=predictions)
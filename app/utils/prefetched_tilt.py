@@ -0,0 +1,195 @@
+from collections import defaultdict
+from typing import Dict, List, Mapping, Tuple
+
+from bson import ObjectId
+from config import Config
+from database.models import Task, Annotation, HiddenAnnotation, LinkedAnnotation
+from mongoengine import DoesNotExist
+from utils.schema_tools import get_schema_node
+
+
+def get_recipients_from_category_only(categories: List[str]) -> List[Dict]:
+    recipients = []
+    for category in categories:
+        recipient_from_annotation = {
+            "name": None,
+            "country": None,
+            "division": None,
+            "address": None,
+            "representative": {
+                "name": None,
+                "email": None,
+                "phone": None
+            },
+            "category": category
+        }
+        recipients.append(recipient_from_annotation)
+    return recipients
+
+
+class TaskSubtree:
+
+    def __init__(self, root_task: Task) -> None:
+        """
+        Loads a root task together with all of its subtasks, annotations, linked annotations and hidden
+        annotations with four bulk queries and indexes everything in memory by (task, label).
+        Subtasks are found by their materialized root. The policy text of the subtasks is never loaded.
+
+        Args:
+            root_task (Task): [description]
+        """
+        self.root_id = root_task.id
+        self.task_ids = [self.root_id]
+        self.children = defaultdict(list)
+        self.annotations = defaultdict(list)
+        self.linked_annotations = defaultdict(list)
+        self.hidden_annotations = defaultdict(list)
+        self._load_tasks()
+        self._load_annotations()
+
+    def _load_tasks(self):
+        for subtask in Task.objects(root=self.root_id).only('id', 'parent', 'hierarchy').as_pymongo():
+            hierarchy = tuple(subtask.get('hierarchy', []))
+            self.children[(subtask['parent'], hierarchy)].append(subtask['_id'])
+            self.task_ids.append(subtask['_id'])
+
+    def _load_annotations(self):
+        for annotation in Annotation.objects(task__in=self.task_ids).only(
+                'task', 'label', 'text').as_pymongo():
+            self.annotations[(annotation['task'], annotation['label'])].append(annotation['text'])
+        for linked_annotation in LinkedAnnotation.objects(task__in=self.task_ids).only(
+                'task', 'label', 'manual', 'value').as_pymongo():
+            key = (linked_annotation['task'], linked_annotation['label'], linked_annotation['manual'])
+            self.linked_annotations[key].append(linked_annotation.get('value'))
+        for hidden_annotation in HiddenAnnotation.objects(task__in=self.task_ids).only(
+                'task', 'label', 'value').as_pymongo():
+            key = (hidden_annotation['task'], hidden_annotation['label'])
+            self.hidden_annotations[key].append(hidden_annotation['value'])
+
+    def get_children(self, task_id: ObjectId, hierarchy: List[str]) -> List[ObjectId]:
+        return self.children.get((task_id, tuple(hierarchy)), [])
+
+    def get_annotation_texts(self, task_id: ObjectId, label: str) -> List[str]:
+        return self.annotations.get((task_id, label), [])
+
+    def get_annotation_text(self, task_id: ObjectId, label: str) -> str:
+        return self._get_single(self.annotations, (task_id, label), Annotation)
+
+    def get_linked_value(self, task_id: ObjectId, label: str, manual: bool) -> bool:
+        return self._get_single(self.linked_annotations, (task_id, label, manual), LinkedAnnotation)
+
+    def get_hidden_value(self, task_id: ObjectId, label: str) -> str:
+        return self._get_single(self.hidden_annotations, (task_id, label), HiddenAnnotation)
+
+    @staticmethod
+    def _get_single(index: Dict, key: Tuple, model):
+        """
+        Mirrors the semantics of 'Model.objects.get(...)' for the in memory index, so that callers
+        can handle missing or ambiguous entries exactly like they would for a database query.
+        """
+        values = index.get(key, [])
+        if not values:
+            raise model.DoesNotExist(f"{model.__name__} matching query does not exist.")
+        if len(values) > 1:
+            raise model.MultipleObjectsReturned(f"{len(values)} or more items returned, instead of 1")
+        return values[0]
+
+
+class PrefetchedTiltBuilder:
+
+    def __init__(self, root_task: Task) -> None:
+        """
+        Builds the tilt representation of a root task from a bulk loaded TaskSubtree. The output is
+        identical to the recursive database walk in 'utils.create_tilt.iterate_through_hierarchy_level',
+        but every lookup is answered from memory.
+
+        Args:
+            root_task (Task): [description]
+        """
+        self.schema = Config.SCHEMA_DICT
+        self.subtree = TaskSubtree(root_task)
+
+    def build(self) -> Dict:
+        return {entry: self.build_section(entry) for entry in self.schema.keys()}
+
+    def build_section(self, entry: str):
+        return self._build_hierarchy_level(self.subtree.root_id, [entry])
+
+    def _build_hierarchy_level(self, parent_id: ObjectId, hierarchy: List[str]):
+        schema_node = get_schema_node(hierarchy)
+        if schema_node.multiple:
+            return self._build_list_level(parent_id, hierarchy, schema_node.schema)
+        return self._build_single_level(parent_id, hierarchy, schema_node.schema)
+
+    def _build_list_level(self, parent_id: ObjectId, hierarchy: List[str], local_schema) -> List:
+        subtree = self.subtree
+        task_ids = subtree.get_children(parent_id, hierarchy)
+        tilt_value = []
+        if task_ids:
+            for task_id in task_ids:
+                tilt_value_part = {}
+                for key, val in local_schema.items():
+                    if key in ['_desc', '_key', "recipientsOnlyCategory"]:
+                        continue
+                    elif type(val) in [dict, list]:
+                        tilt_value_part[key] = self._build_hierarchy_level(task_id, hierarchy + [key])
+                    elif key == "_id":
+                        tilt_value_part[key] = subtree.get_hidden_value(task_id, val)
+                    elif key.startswith("~"):
+                        if val.startswith("#"):
+                            tilt_value_part[key[1:]] = subtree.get_linked_value(task_id, key, manual=False)
+                        else:
+                            try:
+                                tilt_value_part[key[1:]] = subtree.get_linked_value(task_id, key, manual=True)
+                            except DoesNotExist:
+                                tilt_value_part[key[1:]] = "False"
+                    else:
+                        try:
+                            tilt_value_part[key] = subtree.get_annotation_text(task_id, val)
+                        except DoesNotExist:
+                            tilt_value_part[key] = None
+                tilt_value.append(tilt_value_part)
+
+            # special case for recipientsOnlyCategory
+            if hierarchy[-1] == "recipients":
+                tilt_value += self._get_recipients_from_category_only(parent_id)
+
+        elif isinstance(local_schema, Mapping):
+            # special case for recipientsOnlyCategory
+            if hierarchy[-1] == "recipients":
+                recipients = self._get_recipients_from_category_only(parent_id)
+                if recipients:
+                    return tilt_value + recipients
+            annotations_list = list(subtree.get_annotation_texts(parent_id, local_schema["_desc"]))
+            tilt_value_part = {key: list(annotations_list) for key in local_schema.keys()
+                               if key not in ['_desc', '_key']}
+            tilt_value.append(tilt_value_part)
+        else:
+            tilt_value = list(subtree.get_annotation_texts(parent_id, local_schema))
+        return tilt_value
+
+    def _build_single_level(self, parent_id: ObjectId, hierarchy: List[str], local_schema) -> Dict:
+        subtree = self.subtree
+        task_ids = subtree.get_children(parent_id, hierarchy)
+        child_id = task_ids[0] if task_ids else None
+        tilt_value = {}
+        for key, val in local_schema.items():
+            if type(val) in [dict, list]:
+                tilt_value[key] = self._build_hierarchy_level(child_id, hierarchy + [key])
+            elif key in ['_desc', '_key']:
+                continue
+            elif key.startswith("~"):
+                try:
+                    tilt_value[key[1:]] = subtree.get_linked_value(child_id, key, manual=not val.startswith("#"))
+                except DoesNotExist:
+                    tilt_value[key[1:]] = None
+            else:
+                try:
+                    tilt_value[key] = subtree.get_annotation_text(child_id, val)
+                except DoesNotExist:
+                    tilt_value[key] = None
+        return tilt_value
+
+    def _get_recipients_from_category_only(self, parent_id: ObjectId) -> List[Dict]:
+        category_texts = self.subtree.get_annotation_texts(parent_id, "Data Disclosed - Recipient Category Only")
+        return get_recipients_from_category_only(category_texts)
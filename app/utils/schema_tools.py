@@ -1,3 +1,7 @@
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Tuple, Union
+
 from config import Config
 from utils.label import AnnotationLabel
 
@@ -21,28 +25,82 @@ def construct_first_level_labels(as_dict: bool = None):
     return labels
 
 
+@dataclass(frozen=True)
+class SchemaNode:
+    """
+    Compiled entry of the tilt schema for a single hierarchy. 'schema' is a read-only view of the
+    schema level, or the label name if the hierarchy points to a plain schema value.
+    """
+    hierarchy: Tuple[str, ...]
+    schema: Union[Mapping, str]
+    multiple: bool = False
+    children: Tuple[str, ...] = ()
+    manual_bools: Tuple[Tuple[str, str], ...] = ()
+    linked_bools: Tuple[Tuple[str, str], ...] = ()
+    desc: str = None
+    key: str = None
+    child_positions: Mapping = field(default_factory=dict)
+
+    def children_from(self, trigger: str) -> Tuple[str, ...]:
+        """
+        Returns all children, which are placed after the trigger in the schema, including the trigger.
+        """
+        if trigger not in self.child_positions:
+            return ()
+        return self.children[self.child_positions[trigger]:]
+
+
+def compile_schema_index(schema: Dict) -> Mapping:
+    """
+    Compiles the tilt schema once into an immutable index of SchemaNodes, which is keyed by the hierarchy
+    tuple. Children are the keys of a schema level, which open a new hierarchy level (and thus subtasks).
+
+    Args:
+        schema (Dict): [description]
+
+    Returns:
+        Mapping: [description]
+    """
+    schema_index = {}
+
+    def compile_level(hierarchy: Tuple[str, ...], level: Union[Dict, List, str]):
+        multiple = isinstance(level, list)
+        level = level[0] if multiple else level
+        if not isinstance(level, dict):
+            schema_index[hierarchy] = SchemaNode(hierarchy=hierarchy, schema=level, multiple=multiple)
+            return
+        children = []
+        for key, value in level.items():
+            if isinstance(value, (dict, list)):
+                compile_level(hierarchy + (key,), value)
+                if isinstance(schema_index[hierarchy + (key,)].schema, Mapping):
+                    children.append(key)
+        bools = [(key, value) for key, value in level.items() if key.startswith("~")]
+        schema_index[hierarchy] = SchemaNode(
+            hierarchy=hierarchy,
+            schema=MappingProxyType(level),
+            multiple=multiple,
+            children=tuple(children),
+            manual_bools=tuple((key, value) for key, value in bools if not value.startswith("#")),
+            linked_bools=tuple((key, value) for key, value in bools if value.startswith("#")),
+            desc=level.get("_desc"),
+            key=level.get("_key"),
+            child_positions=MappingProxyType({child: idx for idx, child in enumerate(children)}))
+
+    compile_level((), schema)
+    return MappingProxyType(schema_index)
+
+
+SCHEMA_INDEX = compile_schema_index(Config.SCHEMA_DICT)
+
+
+def get_schema_node(hierarchy) -> SchemaNode:
+    return SCHEMA_INDEX[tuple(hierarchy)]
+
+
 def retrieve_schema_level(hierarchy):
-    schema = Config.SCHEMA_DICT.copy()
-    for path_entry in hierarchy:
-        try:
-            schema = schema[path_entry]
-        except TypeError:
-            schema = schema[0][path_entry]
-    if isinstance(schema, list):
-        schema = schema[0]
-    return schema
+    return get_schema_node(hierarchy).schema
 
 
 def get_manual_bools(hierarchy):
-    schema = retrieve_schema_level(hierarchy)
-    return [(k, v) for (k, v) in schema.items() if k[0] == '~' and v[0] != '#']
-
-def reduce_schema(schema, trigger):
-    return_schema = schema.copy()
-    for entry in schema.keys():
-        if entry != trigger:
-            return_schema.pop(entry)
-        else:
-            break
-    return return_schema
-
+    return list(get_schema_node(hierarchy).manual_bools)
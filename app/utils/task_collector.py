@@ -0,0 +1,87 @@
+import threading
+import time
+from datetime import datetime
+
+from config import Config
+from database.models import Annotation, HiddenAnnotation, LinkedAnnotation, MetaTask, Task
+from database.unit_of_work import get_unit_of_work
+from mongoengine import Q
+from tilt_resources.tilt_cache import TiltSectionCache
+from utils.task_traversal import TaskTraversalOrder
+
+
+def tombstone_task(task: Task):
+    """
+    Marks a task and all of its subtasks as deleted with a single update. Tombstoned tasks are hidden from
+    all reads once the update is written, their documents are removed in the background by the task
+    collector.
+
+    Args:
+        task (Task): [description]
+    """
+    get_unit_of_work().update(Task.all_objects(Q(id=task.id) | Q(ancestors=task.id), deleted_at=None),
+                              set__deleted_at=datetime.utcnow())
+
+
+class TaskCollector:
+
+    def __init__(self, batch_size: int = Config.COLLECTOR_BATCH_SIZE,
+                 interval: int = Config.COLLECTOR_INTERVAL) -> None:
+        """
+        Removes tombstoned tasks together with their annotations, linked annotations, hidden annotations
+        and meta documents. Every batch is removed with one delete per collection, the tasks themselves
+        are removed last, so an interrupted batch is collected again.
+
+        Args:
+            batch_size (int, optional): tasks per batch. Defaults to Config.COLLECTOR_BATCH_SIZE.
+            interval (int, optional): seconds between two checks. Defaults to Config.COLLECTOR_INTERVAL.
+        """
+        self.batch_size = batch_size
+        self.interval = interval
+        self._thread = None
+
+    def collect(self) -> int:
+        """
+        Removes a batch of tombstoned tasks.
+
+        Returns:
+            int: number of removed tasks
+        """
+        tasks = list(Task.all_objects(deleted_at__lte=datetime.utcnow()).only('id', 'parent').limit(
+            self.batch_size).as_pymongo())
+        if not tasks:
+            return 0
+        task_ids = [task['_id'] for task in tasks]
+        # subtasks created below a task, while it was tombstoned
+        Task.all_objects(ancestors__in=task_ids, deleted_at=None).update(set__deleted_at=datetime.utcnow())
+
+        Annotation.objects(task__in=task_ids).delete()
+        LinkedAnnotation.objects(task__in=task_ids).delete()
+        HiddenAnnotation.objects(task__in=task_ids).delete()
+        root_ids = [task['_id'] for task in tasks if task.get('parent') is None]
+        if root_ids:
+            MetaTask.objects(root_task__in=root_ids).delete()
+            for root_task in Task.all_objects(id__in=root_ids):
+                TiltSectionCache.drop(root_task)
+                TaskTraversalOrder.drop(root_task)
+        Task.all_objects(id__in=task_ids).delete()
+        return len(task_ids)
+
+    def start(self):
+        """
+        Starts the background collector thread of this process.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="task-collector", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                # remove full batches right away
+                while self.collect() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(Warning(f"Collecting deleted tasks failed: {e}"))
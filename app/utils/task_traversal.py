@@ -0,0 +1,110 @@
+from collections import defaultdict
+from typing import Dict, List, Union
+
+from bson import ObjectId
+from database.models import Task, TaskTraversal
+from database.unit_of_work import get_unit_of_work
+from mongoengine import NotUniqueError
+from tilt_resources.tilt_cache import RootRevision, get_root_task
+from utils.schema_tools import get_schema_node
+
+
+def compute_traversal_order(root_id: ObjectId) -> List[ObjectId]:
+    """
+    Computes the annotation order of all tasks of a root task. Tasks are visited depth-first, the children
+    of a task are ordered by the position of their schema entry and then by their id.
+
+    Args:
+        root_id (ObjectId): [description]
+
+    Returns:
+        List[ObjectId]: [description]
+    """
+    children = defaultdict(list)
+    for subtask in Task.objects(root=root_id).only('id', 'parent', 'hierarchy').as_pymongo():
+        children[subtask['parent']].append(subtask)
+
+    traversal_order = []
+
+    def visit(task_id: ObjectId, hierarchy: List[str]):
+        traversal_order.append(task_id)
+        schema_node = get_schema_node(hierarchy)
+        child_tasks = [child_task for child_task in children.get(task_id, [])
+                       if child_task['hierarchy'][:-1] == hierarchy
+                       and child_task['hierarchy'][-1] in schema_node.child_positions]
+        child_tasks.sort(key=lambda child_task: (schema_node.child_positions[child_task['hierarchy'][-1]],
+                                                 child_task['_id']))
+        for child_task in child_tasks:
+            visit(child_task['_id'], child_task['hierarchy'])
+
+    visit(root_id, [])
+    return traversal_order
+
+
+class TaskTraversalOrder:
+
+    @staticmethod
+    def get_order(root_task: Task) -> List[ObjectId]:
+        """
+        Returns the stored traversal order of a root task. The order is only computed, if it was
+        invalidated by the creation or deletion of subtasks.
+
+        Args:
+            root_task (Task): [description]
+
+        Returns:
+            List[ObjectId]: [description]
+        """
+        traversal = TaskTraversal.objects(root_task=root_task).first()
+        if traversal and traversal.task_ids:
+            return traversal.task_ids
+        traversal_order = compute_traversal_order(root_task.id)
+        revision = traversal.revision if traversal else 0
+        try:
+            TaskTraversal.objects(root_task=root_task, revision=revision).update_one(
+                set__task_ids=traversal_order, upsert=True)
+        except NotUniqueError:
+            print("Traversal order was invalidated during creation. Skipping storage.")
+        return traversal_order
+
+    @staticmethod
+    def get_next_task_id(task: Task) -> Union[ObjectId, None]:
+        traversal_order = TaskTraversalOrder.get_order(get_root_task(task))
+        return TaskTraversalOrder._find_successor(traversal_order, task.id)
+
+    @staticmethod
+    def _find_successor(traversal_order: List[ObjectId], task_id: ObjectId) -> Union[ObjectId, None]:
+        try:
+            position = traversal_order.index(task_id)
+        except ValueError:
+            return None
+        return traversal_order[position + 1] if position + 1 < len(traversal_order) else None
+
+    @staticmethod
+    def to_dict(task: Task) -> Dict:
+        root_task = get_root_task(task)
+        traversal_order = TaskTraversalOrder.get_order(root_task)
+        next_task_id = TaskTraversalOrder._find_successor(traversal_order, task.id)
+        return {
+            "root_task": str(root_task.id),
+            "next": str(next_task_id) if next_task_id else None,
+            "order": [str(task_id) for task_id in traversal_order]
+        }
+
+    @staticmethod
+    def invalidate(task: Task):
+        """
+        Invalidates the traversal order of the root task of the given task and increases the revision of
+        the root task.
+
+        Args:
+            task (Task): [description]
+        """
+        root_task = get_root_task(task)
+        RootRevision.bump(root_task)
+        get_unit_of_work().update(TaskTraversal.objects(root_task=root_task), upsert=True, multi=False,
+                                  inc__revision=1, set__task_ids=[])
+
+    @staticmethod
+    def drop(root_task: Task):
+        TaskTraversal.objects(root_task=root_task).delete()
@@ -0,0 +1,160 @@
+import contextlib
+import json
+import os
+from typing import Dict, Iterator, Tuple
+
+from database.models import MetaTask, Task
+from tilt_resources.tilt_cache import TiltSectionCache
+from utils.create_tilt import create_tilt
+from utils.tilt_workers import iterate_in_pool
+
+
+def export_tilt_json(root_id: str) -> Tuple[str, str, str, str]:
+    """
+    Creates the tilt document of a root task inside a worker process.
+
+    Args:
+        root_id (str): [description]
+
+    Returns:
+        Tuple[str, str, str, str]: root id, hash, serialized document and error message
+    """
+    try:
+        document = create_tilt(root_id)
+    except Exception as e:
+        return root_id, None, None, str(e)
+    return root_id, document.get("meta", {}).get("_hash"), json.dumps(document), None
+
+
+class TiltExporter:
+
+    def __init__(self, output_path: str, jsonl: bool = False, checkpoint_path: str = None,
+                 processes: int = None, force: bool = False) -> None:
+        """
+        Exports the tilt documents of all root tasks into a directory (one file per root task) or into a
+        single JSONL file. Every exported document is recorded with its hash in an append-only checkpoint
+        file. Documents whose hash did not change since they were recorded are skipped, so an interrupted
+        export can simply be restarted.
+
+        Args:
+            output_path (str): [description]
+            jsonl (bool, optional): [description]. Defaults to False.
+            checkpoint_path (str, optional): [description]. Defaults to None.
+            processes (int, optional): [description]. Defaults to None.
+            force (bool, optional): Ignore the checkpoint and export everything. Defaults to False.
+        """
+        self.output_path = output_path
+        self.jsonl = jsonl
+        self.checkpoint_path = checkpoint_path if checkpoint_path \
+            else output_path.rstrip(os.sep) + ".checkpoint"
+        self.processes = processes
+        self.checkpoint = {} if force else self._read_checkpoint()
+        self.line_count = 0
+        self.skipped = 0
+
+    def _read_checkpoint(self) -> Dict[str, Dict]:
+        checkpoint = {}
+        if os.path.isfile(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as checkpoint_file:
+                for line in checkpoint_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # line of an interrupted run
+                        continue
+                    checkpoint[entry["id"]] = entry
+        return checkpoint
+
+    def find_outdated_root_ids(self) -> Iterator[str]:
+        """
+        Yields all root task ids, which were not exported yet or changed since their export. The hash of a
+        MetaTask is only up to date, if none of the cached tilt sections of its root task are invalidated.
+
+        Yields:
+            Iterator[str]: [description]
+        """
+        clean_root_ids = TiltSectionCache.get_clean_root_ids()
+        meta_hashes = {meta_task["root_task"]: meta_task.get("_hash")
+                       for meta_task in MetaTask.objects.only("root_task", "_hash").as_pymongo()}
+        for root_id in Task.objects(parent=None).scalar("id"):
+            entry = self.checkpoint.get(str(root_id))
+            if entry and entry["_hash"] and root_id in clean_root_ids \
+                    and entry["_hash"] == meta_hashes.get(root_id):
+                self.skipped += 1
+                continue
+            yield str(root_id)
+
+    def run(self) -> Dict[str, int]:
+        exported = 0
+        failed = 0
+        if not self.jsonl:
+            os.makedirs(self.output_path, exist_ok=True)
+        with open(self.checkpoint_path, "a" if self.checkpoint else "w") as checkpoint_file, \
+                self._open_output() as output_file:
+            for root_id, tilt_hash, document_json, error in iterate_in_pool(
+                    self.find_outdated_root_ids(), worker=export_tilt_json, processes=self.processes):
+                if error:
+                    print(Warning(f"Could not export tilt document for {root_id}: {error}"))
+                    failed += 1
+                    continue
+                entry = {"id": root_id, "_hash": tilt_hash}
+                if self.jsonl:
+                    output_file.write(document_json + "\n")
+                    output_file.flush()
+                    entry["line"] = self.line_count
+                    self.line_count += 1
+                else:
+                    self._write_document_file(root_id, document_json)
+                checkpoint_file.write(json.dumps(entry) + "\n")
+                checkpoint_file.flush()
+                self.checkpoint[root_id] = entry
+                exported += 1
+        if self.jsonl:
+            self._compact()
+        return {"exported": exported, "skipped": self.skipped, "failed": failed}
+
+    def _open_output(self):
+        if not self.jsonl:
+            return contextlib.nullcontext()
+        if not self.checkpoint or not os.path.isfile(self.output_path):
+            self.checkpoint = {}
+            return open(self.output_path, "w")
+        ends_with_newline = True
+        with open(self.output_path, "r") as output_file:
+            for line in output_file:
+                self.line_count += 1
+                ends_with_newline = line.endswith("\n")
+        output_file = open(self.output_path, "a")
+        if not ends_with_newline:
+            # terminate the line of an interrupted run, it is dropped during compaction
+            output_file.write("\n")
+        return output_file
+
+    def _write_document_file(self, root_id: str, document_json: str):
+        file_path = os.path.join(self.output_path, f"{root_id}.json")
+        with open(file_path + ".tmp", "w") as document_file:
+            document_file.write(document_json)
+        os.replace(file_path + ".tmp", file_path)
+
+    def _compact(self):
+        """
+        Removes lines of outdated document versions and interrupted runs from the JSONL file, so that it
+        contains every root task exactly once.
+        """
+        current_lines = {entry["line"]: root_id for root_id, entry in self.checkpoint.items()
+                         if "line" in entry}
+        line_count = 0
+        with open(self.output_path, "r") as output_file, \
+                open(self.output_path + ".tmp", "w") as compacted_file:
+            for line_idx, line in enumerate(output_file):
+                root_id = current_lines.get(line_idx)
+                if root_id is None:
+                    continue
+                compacted_file.write(line if line.endswith("\n") else line + "\n")
+                self.checkpoint[root_id]["line"] = line_count
+                line_count += 1
+        with open(self.checkpoint_path + ".tmp", "w") as checkpoint_file:
+            for entry in self.checkpoint.values():
+                checkpoint_file.write(json.dumps(entry) + "\n")
+        os.replace(self.output_path + ".tmp", self.output_path)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
@@ -0,0 +1,95 @@
+import json
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import fastjsonschema
+from config import Config
+from utils.create_tilt import create_tilt
+from utils.tilt_workers import iterate_in_pool
+
+
+@lru_cache(maxsize=None)
+def get_tilt_validator() -> Callable:
+    """
+    Compiles the complete tilt schema once per process.
+    """
+    return fastjsonschema.compile(Config.COMPLETE_SCHEMA)
+
+
+@lru_cache(maxsize=None)
+def get_section_validators() -> Dict[str, Callable]:
+    """
+    Compiles one validator per top-level property of the complete tilt schema. fastjsonschema stops at the
+    first error, validating every section on its own reports one failing path per section instead of one
+    per document. The sections keep their position in the schema, so the '$id' entries still resolve.
+    """
+    schema = Config.COMPLETE_SCHEMA
+    section_validators = {}
+    for section, section_schema in schema["properties"].items():
+        section_validators[section] = fastjsonschema.compile(
+            dict(schema,
+                 required=[section] if section in schema.get("required", []) else [],
+                 properties={section: section_schema}))
+    return section_validators
+
+
+def validate_tilt(document: Dict) -> Tuple[str, bool]:
+    try:
+        get_tilt_validator()(document)
+        return 'Validation successful!', True
+    except fastjsonschema.exceptions.JsonSchemaValueException as js:
+        return str(js), False
+
+
+def find_failing_paths(document: Dict) -> List[Dict]:
+    failing_paths = []
+    for section_validator in get_section_validators().values():
+        try:
+            section_validator(document)
+        except fastjsonschema.exceptions.JsonSchemaValueException as js:
+            failing_paths.append({"path": js.name, "message": str(js)})
+    return failing_paths
+
+
+def validate_tilt_json(root_id: str) -> str:
+    """
+    Creates and validates the tilt document of a root task inside a worker process.
+
+    Args:
+        root_id (str): [description]
+
+    Returns:
+        str: [description]
+    """
+    try:
+        document = create_tilt(root_id)
+    except Exception as e:
+        return json.dumps({"id": root_id, "name": None, "valid": False,
+                           "errors": [{"path": None, "message": str(e)}]})
+    failing_paths = find_failing_paths(document)
+    return json.dumps({"id": root_id, "name": document.get("meta", {}).get("name"),
+                       "valid": not failing_paths, "errors": failing_paths})
+
+
+def create_validation_report(root_ids: Iterable, processes: int = None) -> Dict:
+    """
+    Validates the tilt documents of all supplied root tasks in a process pool and collects the results in
+    a single report.
+
+    Args:
+        root_ids (Iterable): [description]
+        processes (int, optional): [description]. Defaults to None.
+
+    Returns:
+        Dict: [description]
+    """
+    documents = [json.loads(result) for result in iterate_in_pool(root_ids, worker=validate_tilt_json,
+                                                                  processes=processes)]
+    documents.sort(key=lambda document: document["id"])
+    invalid_count = sum(not document["valid"] for document in documents)
+    return {
+        "total": len(documents),
+        "valid": len(documents) - invalid_count,
+        "invalid": invalid_count,
+        "documents": documents
+    }
@@ -0,0 +1,93 @@
+import json
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator
+
+from config import Config
+from mongoengine import connect
+from utils.create_tilt import create_tilt
+
+# one long-lived pool per process, shared by all calls of iterate_in_pool
+_tilt_pool = None
+_tilt_pool_lock = threading.Lock()
+
+
+def init_tilt_worker():
+    """
+    Entry point of the tilt worker processes, they only import this module and the worker functions.
+    Every worker process opens its own database connection, MongoClients must not be shared between
+    processes. Spawned workers import the main module of the parent again as __mp_main__, so its startup
+    side effects have to be guarded.
+    """
+    connect(**Config.MONGODB_SETTINGS)
+
+
+def create_tilt_json(root_id: str) -> str:
+    """
+    Creates the tilt document of a root task inside a worker process and returns it as a JSON line.
+    Errors are returned as JSON lines as well, so a single broken document does not abort a whole run.
+
+    Args:
+        root_id (str): [description]
+
+    Returns:
+        str: [description]
+    """
+    try:
+        return json.dumps(create_tilt(root_id))
+    except Exception as e:
+        return json.dumps({"id": root_id, "error": str(e)})
+
+
+def get_tilt_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process pool of this process. The pool is created on first use and reused by all calls,
+    the workers are started once and keep their database connection. A pool, which broke because a worker
+    died, is replaced.
+
+    Returns:
+        ProcessPoolExecutor: [description]
+    """
+    global _tilt_pool
+    with _tilt_pool_lock:
+        if _tilt_pool is None or _tilt_pool._broken:
+            _tilt_pool = ProcessPoolExecutor(max_workers=Config.TILT_WORKER_PROCESSES,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=init_tilt_worker)
+        return _tilt_pool
+
+
+def iterate_in_pool(root_ids: Iterable, worker: Callable[[str], Any] = create_tilt_json,
+                    processes: int = None) -> Iterator[Any]:
+    """
+    Applies the worker function to every root id in the shared process pool and yields the results as soon
+    as they are ready. At most as many root ids as processes are in flight, so a call never occupies more
+    workers and memory stays flat independent of the number of root tasks. The order of the results is not
+    preserved.
+
+    Args:
+        root_ids (Iterable): [description]
+        worker (Callable[[str], Any], optional): [description]. Defaults to create_tilt_json.
+        processes (int, optional): [description]. Defaults to None.
+
+    Yields:
+        Iterator[Any]: [description]
+    """
+    window = max(1, min(processes or Config.TILT_WORKER_PROCESSES, Config.TILT_WORKER_PROCESSES))
+    executor = get_tilt_pool()
+    pending = set()
+    try:
+        for root_id in root_ids:
+            pending.add(executor.submit(worker, str(root_id)))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
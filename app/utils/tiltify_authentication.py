@@ -1,9 +1,93 @@
+import base64
+import json
+import threading
+import time
+from typing import Union
+
 import requests
 
 from config import Config, TILTIFY
 
 
-def get_tiltify_token():
+def request_tiltify_token() -> str:
     payload = {"password": Config.JWT_SECRET_KEY}
     url = f"http://{TILTIFY.address}:{TILTIFY.port}"
-    return requests.post(url + '/api/auth', json=payload, headers={'Content-Type': 'application/json'}).json()
+    response = requests.post(url + '/api/auth', json=payload, headers={'Content-Type': 'application/json'},
+                             timeout=Config.TILTIFY_AUTH_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def read_token_expiry(token: str) -> Union[float, None]:
+    """
+    Reads the expiry ('exp' claim) of a JWT without verifying its signature.
+
+    Args:
+        token (str): [description]
+
+    Returns:
+        Union[float, None]: expiry as unix timestamp or None, if the token has no readable expiry
+    """
+    try:
+        token_payload = token.split(" ")[-1].split(".")[1]
+        token_payload += "=" * (-len(token_payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(token_payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TiltifyTokenCache:
+
+    def __init__(self) -> None:
+        """
+        Process wide cache for the TILTify access token. The token is reused until shortly before it
+        expires, concurrent callers share a single refresh. If TILTify can not be reached, the last token
+        is served as long as it is valid and no further refresh is attempted for a short delay.
+        """
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at - Config.TILTIFY_TOKEN_REFRESH_MARGIN
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at
+
+    def get_token(self) -> Union[str, None]:
+        """
+        Returns a valid TILTify token or None, if TILTify is not available.
+
+        Returns:
+            Union[str, None]: [description]
+        """
+        if self._is_fresh():
+            return self._token
+        with self._lock:
+            # the token might have been refreshed while waiting for the lock
+            if self._is_fresh() or time.time() < self._retry_at:
+                return self._token if self._is_valid() else None
+            try:
+                token = request_tiltify_token()
+            except (requests.RequestException, ValueError) as e:
+                print(Warning(f"TILTify token could not be refreshed: {e}"))
+                self._retry_at = time.time() + Config.TILTIFY_RETRY_DELAY
+                return self._token if self._is_valid() else None
+            expires_at = read_token_expiry(token)
+            self._token = token
+            self._expires_at = expires_at if expires_at else time.time() + Config.TILTIFY_TOKEN_LIFETIME
+            return self._token
+
+    def clear(self):
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+            self._retry_at = 0.0
+
+
+tiltify_token_cache = TiltifyTokenCache()
+
+
+def get_tiltify_token() -> Union[str, None]:
+    return tiltify_token_cache.get_token()
@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import requests
+from bson import ObjectId
+from config import Config, TILTIFY
+from database.models import PolicyText, TrainingQueueEntry, TrainingTimestamp
+from mongoengine import Q
+from utils.tiltify_authentication import get_tiltify_token
+
+
+def create_training_payload(entries: List[TrainingQueueEntry]) -> Dict:
+    """
+    Coalesces queue entries per document into a single training request. Duplicate annotations of a
+    document are only sent once.
+
+    Args:
+        entries (List[TrainingQueueEntry]): [description]
+
+    Returns:
+        Dict: [description]
+    """
+    text_hashes = {entry.policy_text.pk for entry in entries if entry.policy_text}
+    policy_texts = PolicyText.objects.in_bulk(list(text_hashes))
+    documents = {}
+    for entry in entries:
+        text_hash = entry.policy_text.pk if entry.policy_text else None
+        document = documents.setdefault((entry.document_name, text_hash), {
+            'document': {
+                'document_name': entry.document_name,
+                'text': policy_texts[text_hash].text if text_hash in policy_texts else None
+            },
+            'annotations': []})
+        annotation = {
+            'annotation_label': entry.label,
+            'annotation_text': entry.text,
+            'annotation_start': entry.start,
+            'annotation_end': entry.end
+        }
+        if annotation not in document['annotations']:
+            document['annotations'].append(annotation)
+    return {
+        'documents': list(documents.values()),
+        'labels': sorted({entry.label for entry in entries})
+    }
+
+
+class TrainingQueue:
+
+    def __init__(self, batch_size: int = Config.TRAINING_BATCH_SIZE, debounce: int = Config.TRAINING_DEBOUNCE,
+                 max_age: int = Config.TRAINING_MAX_AGE, interval: int = Config.TRAINING_FLUSH_INTERVAL) -> None:
+        """
+        Sends the queued annotations to TILTify in batches. A batch is sent as soon as it is full, when no
+        annotation was queued for the debounce period or when the oldest queued annotation reaches the
+        maximum age. Entries are claimed before they are sent, so several flushers can run in parallel.
+
+        Args:
+            batch_size (int, optional): [description]. Defaults to Config.TRAINING_BATCH_SIZE.
+            debounce (int, optional): seconds without new entries. Defaults to Config.TRAINING_DEBOUNCE.
+            max_age (int, optional): seconds. Defaults to Config.TRAINING_MAX_AGE.
+            interval (int, optional): seconds between two checks. Defaults to Config.TRAINING_FLUSH_INTERVAL.
+        """
+        self.batch_size = batch_size
+        self.debounce = debounce
+        self.max_age = max_age
+        self.interval = interval
+        self._thread = None
+
+    @staticmethod
+    def _unclaimed() -> Q:
+        claim_timeout = datetime.utcnow() - timedelta(seconds=Config.TRAINING_CLAIM_TIMEOUT)
+        return Q(claim=None) | Q(claimed_at__lt=claim_timeout)
+
+    def is_due(self) -> bool:
+        queued_entries = TrainingQueueEntry.objects(self._unclaimed())
+        entry_count = queued_entries.count()
+        if entry_count == 0:
+            return False
+        if entry_count >= self.batch_size:
+            return True
+        now = datetime.utcnow()
+        newest = queued_entries.order_by('-created').only('created').first()
+        oldest = queued_entries.order_by('created').only('created').first()
+        return newest.created < now - timedelta(seconds=self.debounce) or \
+            oldest.created < now - timedelta(seconds=self.max_age)
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Claims the oldest queued entries and sends them to TILTify in a single request. On success the
+        entries are deleted and the training timestamp is updated, otherwise they are released again.
+
+        Args:
+            force (bool, optional): Send a batch even if it is not due yet. Defaults to False.
+
+        Returns:
+            int: number of sent entries
+        """
+        if not force and not self.is_due():
+            return 0
+        claim = str(ObjectId())
+        entry_ids = list(TrainingQueueEntry.objects(self._unclaimed()).order_by('created').limit(
+            self.batch_size).scalar('id'))
+        TrainingQueueEntry.objects(Q(id__in=entry_ids) & self._unclaimed()).update(
+            set__claim=claim, set__claimed_at=datetime.utcnow())
+        entries = list(TrainingQueueEntry.objects(claim=claim))
+        if not entries:
+            return 0
+
+        tiltify_token = get_tiltify_token()
+        url = f"http://{TILTIFY.address}:{TILTIFY.port}"
+        try:
+            if not tiltify_token:
+                raise requests.ConnectionError("TILTify is not available")
+            response = requests.post(url + "/api/train", json=create_training_payload(entries), timeout=3000,
+                                     headers={'Authorization': tiltify_token, 'Content-Type': 'application/json'})
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(Warning(f"Training call to TILTify failed, {len(entries)} annotations stay queued: {e}"))
+            TrainingQueueEntry.objects(claim=claim).update(set__claim=None, set__claimed_at=None)
+            return 0
+
+        TrainingQueueEntry.objects(claim=claim).delete()
+        TrainingTimestamp.objects().update_one(set__timestamp=datetime.now(), upsert=True)
+        return len(entries)
+
+    def start(self):
+        """
+        Starts the background flusher thread of this process.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="training-queue", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                # send full batches right away
+                while self.flush() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(Warning(f"Flushing the training queue failed: {e}"))
@@ -1,13 +1,39 @@
+from typing import Dict, Tuple
+
 from flask_babel import get_translations, get_locale
+from babel.support import Translations
+
+
+# translation tables per locale, they are rebuilt if Babel loads a new catalog for the locale
+_translation_tables: Dict[str, Tuple[Translations, Dict, Dict]] = {}
+
+
+def get_translation_tables(locale: str, translations: Translations) -> Tuple[Dict, Dict]:
+    """
+    Returns the forward and the reverse translation table of a locale. Both tables are built once per
+    loaded catalog and shared by all requests of the process.
+
+    Args:
+        locale (str): [description]
+        translations (Translations): [description]
+
+    Returns:
+        Tuple[Dict, Dict]: origin_to_trans, trans_to_origin
+    """
+    cached_translations, origin_to_trans, trans_to_origin = _translation_tables.get(locale, (None, None, None))
+    if cached_translations is not translations:
+        origin_to_trans = translations._catalog
+        trans_to_origin = {value: key for key, value in origin_to_trans.items()}
+        _translation_tables[locale] = (translations, origin_to_trans, trans_to_origin)
+    return origin_to_trans, trans_to_origin
 
 
 class Translator:
 
     def __init__(self) -> None:
-        if get_locale() != "en":
-            cache = get_translations()
-            self.trans_to_origin = {value: key for key, value in cache._catalog.items()}
-            self.origin_to_trans = get_translations()._catalog
+        locale = get_locale()
+        if locale != "en":
+            self.origin_to_trans, self.trans_to_origin = get_translation_tables(str(locale), get_translations())
         else:
             self.trans_to_origin = {}
             self.origin_to_trans = {}
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+import json
+import sys
+
+import click
+from config import Config
+from mongoengine import connect
+from database.models import Task
+from utils.tilt_validation import create_validation_report
+
+
+@click.command()
+@click.option("-p", "--processes", default=Config.TILT_WORKER_PROCESSES, type=int,
+              help="Number of worker processes.")
+@click.option("-o", "--output", default=None, type=click.Path(dir_okay=False),
+              help="Write the JSON report to this file instead of stdout.")
+@click.option("-r", "--root_id", multiple=True, help="Restrict validation to a root task id (repeatable).")
+def validate_tilts(processes, output, root_id):
+    """Validates the tilt documents of all root tasks against the complete tilt schema.
+    Exits with status 1 if at least one document is invalid.
+
+    Args:
+        processes ([type]): [description]
+        output ([type]): [description]
+        root_id ([type]): [description]
+    """
+    connect(**Config.MONGODB_SETTINGS)
+    root_tasks = Task.objects(parent=None)
+    if root_id:
+        root_tasks = root_tasks(id__in=list(root_id))
+    report = create_validation_report(root_tasks.scalar('id'), processes=processes)
+    report_json = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as report_file:
+            report_file.write(report_json)
+    else:
+        click.echo(report_json)
+    click.echo(f"{report['valid']} of {report['total']} documents are valid.", err=True)
+    sys.exit(1 if report["invalid"] else 0)
+
+
+if __name__ == "__main__":
+    validate_tilts()
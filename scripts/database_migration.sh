@@ -6,3 +6,7 @@ BASEDIR=$(dirname "$SCRIPT_DIR")
 python3 $BASEDIR/app/database_migration.py -t delete_unbound_obj
 python3 $BASEDIR/app/database_migration.py  -t task_html_entry
 python3 $BASEDIR/app/database_migration.py  -t subtask_annotation
+python3 $BASEDIR/app/database_migration.py  -t task_materialized_path
+python3 $BASEDIR/app/database_migration.py  -t deduplicate_policy_texts
+python3 $BASEDIR/app/database_migration.py  -t compress_policy_texts
+python3 $BASEDIR/app/database_migration.py  -t create_indexes
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import mongoengine
+import pytest
+
+# the app reads its settings from the environment on import
+for name, value in dict(JWT_SECRET_KEY="test", FLASK_SECRET_KEY="test", MONGODB_USERNAME="test",
+                        MONGODB_PASSWORD="test", MONGODB_PORT="27017", MONGO_INITDB_DATABASE="tilter-test",
+                        TILTIFY_ADD="localhost", TILTIFY_PORT="5000").items():
+    os.environ.setdefault(name, value)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+mongoengine.connect("tilter-test", host="mongomock://localhost")
+
+
+@pytest.fixture(autouse=True)
+def database():
+    """
+    Runs every test against an empty in-memory database.
+    """
+    connection = mongoengine.get_connection()
+    connection.drop_database("tilter-test")
+    yield connection.get_database("tilter-test")
+    connection.drop_database("tilter-test")
@@ -0,0 +1,26 @@
+import json
+
+from database.models import Annotation, Task
+from tilt_resources.annotation_ingestion import CREATED, INVALID, AnnotationIngestion
+from tilt_resources.task_creator import TaskCreator
+from utils.task_collector import tombstone_task
+
+TEXT = "personal data is shared with third parties " * 10
+
+
+def annotation_line(task: Task, start: int = 0, end: int = 13) -> str:
+    return json.dumps({"task": str(task.id), "label": task.labels[0]["name"], "start": start, "end": end,
+                       "text": TEXT[start:end]})
+
+
+def test_lines_of_deleted_tasks_are_invalid():
+    task = TaskCreator().create_root_task(name="policy", text=TEXT, url="")
+    deleted_task = TaskCreator().create_root_task(name="deleted", text=TEXT + " ", url="")
+    tombstone_task(deleted_task)
+
+    results = list(AnnotationIngestion().ingest([annotation_line(task), annotation_line(deleted_task)]))
+
+    assert [result["status"] for result in results] == [CREATED, INVALID]
+    assert results[1]["msg"] == "Task does not exist"
+    assert Annotation.objects(task=deleted_task).count() == 0
+    assert Task.all_objects(parent=deleted_task).count() == 0
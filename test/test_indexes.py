@@ -0,0 +1,46 @@
+from datetime import datetime
+from unittest import mock
+
+import pytest
+from bson import ObjectId
+from database.models import Annotation, HiddenAnnotation, LinkedAnnotation, MetaTask, Task
+
+# migration tasks connect to the configured database on import
+with mock.patch("mongoengine.connect"):
+    from utils.migration_task import CreateIndexes
+
+TASK_ID = ObjectId()
+HOT_QUERIES = {
+    "Task(parent, hierarchy)": lambda: Task.objects(parent=TASK_ID, hierarchy=["dataDisclosed"]),
+    "Task(root)": lambda: Task.objects(root=TASK_ID),
+    "Task(deleted_at)": lambda: Task.all_objects(deleted_at__lte=datetime.utcnow()),
+    "Annotation(task, label)": lambda: Annotation.objects(task=TASK_ID, label=""),
+    "Annotation(task, text, start, end, label)": lambda: Annotation.objects(task=TASK_ID, text="", start=0, end=0,
+                                                                            label=""),
+    "LinkedAnnotation(task, label, manual)": lambda: LinkedAnnotation.objects(task=TASK_ID, label="",
+                                                                              manual=False),
+    "LinkedAnnotation(related_to, task)": lambda: LinkedAnnotation.objects(related_to=TASK_ID, task=TASK_ID),
+    "HiddenAnnotation(task, label)": lambda: HiddenAnnotation.objects(task=TASK_ID, label=""),
+    "MetaTask(root_task)": lambda: MetaTask.objects(root_task=TASK_ID)
+}
+
+
+@pytest.mark.parametrize("query_name", HOT_QUERIES)
+def test_hot_queries_use_an_index(query_name):
+    """
+    The query planner picks an index scan, if the filter contains the leading key of an index. The
+    in-memory test database has no planner, so the created indexes are checked instead of 'explain'.
+    """
+    CreateIndexes.run_migration()
+    query = HOT_QUERIES[query_name]()
+    indexes = query._document._get_collection().index_information()
+    assert any(supports_query(index, query._query) for name, index in indexes.items() if name != "_id_"), \
+        f"{query_name} does not use an index"
+
+
+def supports_query(index: dict, query: dict) -> bool:
+    leading_key = index["key"][0][0]
+    if leading_key not in query:
+        return False
+    # sparse indexes do not contain documents without the field, they can not answer null queries
+    return not index.get("sparse") or query[leading_key] is not None
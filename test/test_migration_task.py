@@ -0,0 +1,67 @@
+from unittest import mock
+
+from database.models import Annotation, MetaTask, Task, TaskRevision, TiltSection
+from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.task_creator import TaskCreator
+from tilt_resources.tilt_cache import RootRevision, TiltSectionCache
+from utils.prefetched_tilt import PrefetchedTiltBuilder
+from utils.task_traversal import TaskTraversalOrder, compute_traversal_order
+
+# migration tasks connect to the configured database on import
+with mock.patch("mongoengine.connect"):
+    from utils.migration_task import DeleteUnboundObj, TaskMaterializedPath
+
+
+def annotate(task: Task, label: str, start: int, end: int):
+    # the submission contains all annotations of the task, missing ones are deleted
+    annotation_values = [dict(task=task, label=annotation.label, start=annotation.start, end=annotation.end,
+                              text=annotation.text) for annotation in Annotation.objects(task=task)]
+    annotation_values.append(dict(task=task, label=label, start=start, end=end, text=task.text[start:end]))
+    TaskCreator(task).create_subtasks(AnnotationHandler().synch_task_annotations(task, annotation_values))
+
+
+def create_unmigrated_tree() -> Task:
+    root_task = TaskCreator().create_root_task(name="policy", text="personal data is shared " * 10, url="")
+    annotate(root_task, "Data Disclosed - Category", 0, 13)
+    category_task = Task.objects.get(parent=root_task)
+    annotate(category_task, "Data Disclosed - Purpose", 18, 24)
+    assert Task.objects(parent=category_task).count() == 1
+    Task.objects.update(set__root=None, set__ancestors=[])
+    return root_task
+
+
+def test_caches_built_before_the_migration_are_rebuilt():
+    root_task = create_unmigrated_tree()
+    MetaTask.objects(root_task=root_task).update_one(set___hash="outdated")
+    stale_tilt = TiltSectionCache(root_task).get_tilt_dict()
+    assert TaskTraversalOrder.get_order(root_task) == [root_task.id]
+    etag = RootRevision.get_etag(root_task.id)
+
+    TaskMaterializedPath.run_migration()
+
+    assert Task.objects(root=root_task).count() == Task.objects.count() - 1
+    assert TiltSectionCache(root_task).get_tilt_dict() == PrefetchedTiltBuilder(root_task).build() != stale_tilt
+    assert TaskTraversalOrder.get_order(root_task) == compute_traversal_order(root_task.id)
+    assert len(TaskTraversalOrder.get_order(root_task)) == Task.objects.count()
+    assert RootRevision.get_etag(root_task.id) != etag
+    assert MetaTask.objects.get(root_task=root_task)._hash is None
+    assert TaskRevision.objects.count() == 1
+
+
+def test_deleting_unbound_tasks_invalidates_the_caches():
+    root_task = create_unmigrated_tree()
+    TaskMaterializedPath.run_migration()
+    category_task = Task.objects.get(parent=root_task)
+    purpose_task = Task.objects.get(parent=category_task)
+    TiltSectionCache(root_task).get_tilt_dict()
+    assert purpose_task.id in TaskTraversalOrder.get_order(root_task)
+    etag = RootRevision.get_etag(root_task.id)
+    # the parent of the purpose task disappears, its path can not be resolved anymore
+    Task._get_collection().delete_one({"_id": category_task.id})
+
+    DeleteUnboundObj.run_migration()
+
+    assert Task.objects(id=purpose_task.id).count() == 0
+    assert TiltSection.objects(root_task=root_task, content__ne=None).count() == 0
+    assert purpose_task.id not in TaskTraversalOrder.get_order(root_task)
+    assert RootRevision.get_etag(root_task.id) != etag
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from tilt_resources.task_creator import TaskCreator
+from utils import prediction_cache
+from utils.prediction_cache import DONE, PENDING, PredictionCache, request_predictions
+from utils.task_collector import tombstone_task
+from utils.task_traversal import TaskTraversalOrder
+
+PREDICTIONS = [{"label": "Controller", "text": "lorem", "start": 0, "end": 5}]
+
+
+def mocked_tiltify(predictions):
+    response = mock.Mock()
+    response.json.return_value = {"predictions": predictions}
+    return mock.patch.multiple(prediction_cache, get_tiltify_token=mock.Mock(return_value="token"),
+                               requests=mock.Mock(**{"post.return_value": response}))
+
+
+def test_request_predictions_unwraps_the_response_of_tiltify():
+    task = TaskCreator().create_root_task(name="policy", text="lorem ipsum dolor " * 20, url="")
+    with mocked_tiltify(PREDICTIONS):
+        assert request_predictions(task) == PREDICTIONS
+
+
+def test_computed_predictions_are_cached():
+    task = TaskCreator().create_root_task(name="policy", text="lorem ipsum dolor " * 20, url="")
+    with mocked_tiltify(PREDICTIONS), mock.patch.object(PredictionCache, "executor") as executor:
+        assert PredictionCache.get_predictions(task) == (PENDING, [])
+        # the background computation is run synchronously
+        PredictionCache._compute(*executor.submit.call_args[0][1:])
+        assert PredictionCache.get_predictions(task) == (DONE, PREDICTIONS)
+
+
+def test_prefetch_skips_a_deleted_next_task():
+    task = TaskCreator().create_root_task(name="policy", text="lorem ipsum dolor " * 20, url="")
+    deleted_task = TaskCreator().create_root_task(name="deleted", text="dolor sit amet " * 20, url="")
+    tombstone_task(deleted_task)
+    with mock.patch.object(TaskTraversalOrder, "get_next_task_id", return_value=deleted_task.id), \
+            mock.patch.object(PredictionCache, "schedule") as schedule:
+        PredictionCache.prefetch_next(task)
+    schedule.assert_not_called()
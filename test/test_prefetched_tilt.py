@@ -0,0 +1,103 @@
+import json
+import random
+
+import pytest
+from config import Config
+from database.models import Annotation, Task
+from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.task_creator import TaskCreator
+from utils.create_tilt import iterate_through_hierarchy_level
+from utils.prefetched_tilt import PrefetchedTiltBuilder
+from utils.schema_tools import get_manual_bools
+
+TEXT = "lorem ipsum dolor sit amet consectetur adipiscing elit " * 100
+
+
+def annotate(task: Task, random_generator: random.Random):
+    """
+    Submits up to one new annotation per label of the task, labels are skipped at random. Existing
+    annotations are submitted again, otherwise they would be deleted.
+    """
+    annotation_values = [dict(task=task, label=annotation.label, start=annotation.start, end=annotation.end,
+                              text=annotation.text) for annotation in Annotation.objects(task=task)]
+    annotated_labels = {values["label"] for values in annotation_values}
+    for label in task.labels:
+        if label["name"] in annotated_labels or random_generator.random() < 0.3:
+            continue
+        start = random_generator.randrange(len(TEXT) - 10)
+        annotation_values.append(dict(task=task, label=label["name"], start=start, end=start + 5,
+                                      text=TEXT[start:start + 5]))
+    TaskCreator(task).create_subtasks(AnnotationHandler().synch_task_annotations(task, annotation_values))
+
+
+def set_manual_bools(task: Task, random_generator: random.Random):
+    manual_bools = [{key: random_generator.choice([True, False])} for key, _ in get_manual_bools(task.hierarchy)
+                    if random_generator.random() < 0.7]
+    if manual_bools:
+        AnnotationHandler().create_manual_annotations(manual_bools, task)
+
+
+def create_tree(seed: int, depth: int = 3) -> Task:
+    """
+    Creates a root task with nested subtasks. Some tasks stay without annotations, some manual bools are
+    never submitted.
+    """
+    random_generator = random.Random(seed)
+    root_task = TaskCreator().create_root_task(name=f"policy {seed}", text=TEXT, url="")
+    annotate(root_task, random_generator)
+    level = [root_task]
+    for _ in range(depth):
+        level = [subtask for task in level for subtask in Task.objects(parent=task)]
+        for task in level:
+            if random_generator.random() < 0.8:
+                annotate(task, random_generator)
+            set_manual_bools(task, random_generator)
+    return root_task
+
+
+def build_sections(build_section) -> dict:
+    # ambiguous annotations raise in both builders, the exception type has to match
+    sections = {}
+    for section in Config.SCHEMA_DICT:
+        try:
+            sections[section] = json.dumps(build_section(section), sort_keys=True)
+        except Exception as e:
+            sections[section] = type(e).__name__
+    return sections
+
+
+def assert_parity(root_task: Task):
+    expected = build_sections(lambda section: iterate_through_hierarchy_level(root_task, [section]))
+    tilt_builder = PrefetchedTiltBuilder(root_task)
+    assert build_sections(tilt_builder.build_section) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_parity_on_nested_trees(seed):
+    root_task = create_tree(seed)
+    assert Task.objects(root=root_task, ancestors__size=2).count() > 0
+    assert_parity(root_task)
+
+
+def test_parity_without_annotations():
+    root_task = TaskCreator().create_root_task(name="policy", text=TEXT, url="")
+    assert_parity(root_task)
+
+
+def test_parity_with_subtasks_without_annotations():
+    root_task = TaskCreator().create_root_task(name="policy", text=TEXT, url="")
+    TaskCreator(root_task).create_subtasks(AnnotationHandler().synch_task_annotations(
+        root_task, [dict(task=root_task, label=label["name"], start=idx * 6, end=idx * 6 + 5,
+                         text=TEXT[idx * 6:idx * 6 + 5]) for idx, label in enumerate(root_task.labels)]))
+    assert Task.objects(parent=root_task).count() > 0
+    assert_parity(root_task)
+
+
+def test_parity_with_manual_bools():
+    root_task = create_tree(seed=0, depth=1)
+    manual_tasks = [task for task in Task.objects(root=root_task) if get_manual_bools(task.hierarchy)]
+    assert manual_tasks
+    for task in manual_tasks:
+        AnnotationHandler().create_manual_annotations(
+            [{key: True} for key, _ in get_manual_bools(task.hierarchy)], task)
+    assert_parity(root_task)
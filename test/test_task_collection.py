@@ -0,0 +1,46 @@
+import mongomock
+import pytest
+from api.restx import ns
+from database.models import PolicyText, Task
+from flask import Flask
+from flask_restx import Api
+from tilt_resources.task_creator import TaskCreator
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    Api(app).add_namespace(ns)
+    return app.test_client()
+
+
+def test_texts_are_loaded_in_bulk(client, monkeypatch):
+    texts = {f"policy {idx}": f"privacy policy number {idx}" for idx in range(5)}
+    for name, text in texts.items():
+        TaskCreator().create_root_task(name=name, text=text, url="")
+    queried_collections = []
+    find = mongomock.collection.Collection.find
+
+    def record_find(collection, *args, **kwargs):
+        queried_collections.append(collection.name)
+        return find(collection, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "find", record_find)
+    response = client.get("/task/?fields=name,text")
+
+    assert response.status_code == 200
+    assert {task["name"]: task["text"] for task in response.json} == texts
+    assert queried_collections.count(PolicyText._get_collection_name()) == 1
+
+
+def test_legacy_tasks_return_their_inline_text(client):
+    TaskCreator().create_root_task(name="migrated", text="migrated policy", url="")
+    # tasks which were not migrated by DeduplicatePolicyTexts yet
+    Task._get_collection().insert_one({"name": "legacy", "text": "legacy policy", "hierarchy": [], "labels": []})
+
+    response = client.get("/task/?fields=name,text")
+
+    assert response.status_code == 200
+    assert {task["name"]: task["text"] for task in response.json} == {"migrated": "migrated policy",
+                                                                     "legacy": "legacy policy"}
+    assert "text" not in client.get("/task/").json[0]
@@ -0,0 +1,46 @@
+from database.models import Annotation, MetaTask, Task
+from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.task_creator import TaskCreator
+from utils.schema_tools import construct_first_level_labels
+
+TEXT = "personal data is shared with third parties " * 10
+
+
+def annotate(task: Task, label: str, start: int, end: int):
+    # the submission contains all annotations of the task, missing ones are deleted
+    annotation_values = [dict(task=task, label=annotation.label, start=annotation.start, end=annotation.end,
+                              text=annotation.text) for annotation in Annotation.objects(task=task)]
+    annotation_values.append(dict(task=task, label=label, start=start, end=end, text=TEXT[start:end]))
+    TaskCreator(task).create_subtasks(AnnotationHandler().synch_task_annotations(task, annotation_values))
+
+
+def test_root_task_is_created_once():
+    root_task = TaskCreator().create_root_task(name="policy", text=TEXT, url="")
+    assert TaskCreator().create_root_task(name="policy", text=TEXT, url="").id == root_task.id
+    assert Task.objects.count() == MetaTask.objects.count() == 1
+
+
+def test_legacy_root_task_with_inline_text_is_found():
+    # root task which was not migrated by DeduplicatePolicyTexts yet
+    legacy_id = Task._get_collection().insert_one({
+        "name": "policy", "text": TEXT, "labels": construct_first_level_labels(as_dict=True), "hierarchy": []
+    }).inserted_id
+
+    assert TaskCreator().create_root_task(name="policy", text=TEXT, url="").id == legacy_id
+    assert Task.objects.count() == 1
+    assert MetaTask.objects.count() == 0
+
+
+def test_subtasks_of_unmigrated_subtasks_get_the_root_task():
+    root_task = TaskCreator().create_root_task(name="policy", text=TEXT, url="")
+    annotate(root_task, "Data Disclosed - Category", 0, 14)
+    category_task = Task.objects.get(parent=root_task)
+    # subtask created before the materialized path was introduced
+    Task.objects(id=category_task.id).update(set__root=None, set__ancestors=[])
+    category_task.reload()
+
+    annotate(category_task, "Data Disclosed - Purpose", 15, 19)
+
+    purpose_task = Task.objects.get(parent=category_task)
+    assert purpose_task.root.id == root_task.id
+    assert purpose_task.ancestors == [root_task.id, category_task.id]
@@ -0,0 +1,49 @@
+import mongomock
+from database.models import Annotation, Task, TaskRevision, TaskTraversal, TiltSection
+from database.unit_of_work import UnitOfWork, unit_of_work
+from tilt_resources.annotation_handler import AnnotationHandler
+from tilt_resources.task_creator import TaskCreator
+
+
+def create_tied_annotation() -> Annotation:
+    root_task = TaskCreator().create_root_task(name="policy", text="lorem ipsum dolor " * 20, url="")
+    label = root_task.labels[0]["name"]
+    annotations = AnnotationHandler().synch_task_annotations(
+        root_task, [dict(task=root_task, label=label, start=0, end=5, text="lorem")])
+    TaskCreator(root_task).create_subtasks(annotations)
+    annotation = Annotation.objects.get(task=root_task)
+    assert annotation.child_annotation is not None
+    return annotation
+
+
+def test_cache_collections_are_flushed_last():
+    scope = UnitOfWork()
+    scope.update(TiltSection.objects(section="Controller"), set__content=None)
+    scope.update(TaskRevision.objects(), inc__revision=1)
+    scope.update(TaskTraversal.objects(), set__task_ids=[])
+    scope.delete(Annotation.objects())
+    scope.update(Task.objects(), set__html=False)
+
+    flush_order = scope._flush_order()
+    assert flush_order.index(Task) < flush_order.index(Annotation)
+    assert flush_order[2:] == [TiltSection, TaskRevision, TaskTraversal]
+
+
+def test_annotation_delete_writes_the_invalidations_after_the_data(monkeypatch):
+    annotation = create_tied_annotation()
+    written_collections = []
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def record_bulk_write(collection, *args, **kwargs):
+        written_collections.append(collection.name)
+        return bulk_write(collection, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", record_bulk_write)
+    with unit_of_work():
+        AnnotationHandler().delete(annotation)
+
+    cache_collections = {model._get_collection_name() for model in [TaskRevision, TiltSection, TaskTraversal]}
+    data_collections = [name for name in written_collections if name not in cache_collections]
+    assert set(data_collections) == {Task._get_collection_name(), Annotation._get_collection_name()}
+    assert written_collections[:len(data_collections)] == data_collections
+    assert Annotation.objects(id=annotation.id).count() == 0